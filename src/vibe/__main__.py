@@ -1,125 +1,156 @@
 """Allow `python -m vibe` to run the task loop."""
 
 import argparse
+import importlib
 import logging
+import os
 import sys
+import threading
 from pathlib import Path
 
-from .config import load_config, log_active_config
+from .config import Config, load_config, log_active_config
 from .loop import run_loop
 from .task import TaskQueue, next_task_number, _make_slug
 
+logger = logging.getLogger(__name__)
+
+
+_LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+_LOG_DATEFMT = "%H:%M:%S"
+
+
+def _configure_root_logging(level: int, fmt: str, datefmt: str | None = None) -> None:
+    """配置 root logger. 已有 handler 时直接更新级别和格式（basicConfig 此时是 no-op）."""
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(level=level, format=fmt, datefmt=datefmt)
+        return
+    root.setLevel(level)
+    formatter = logging.Formatter(fmt, datefmt=datefmt)
+    for h in root.handlers:
+        h.setFormatter(formatter)
+
 
 def _setup_logging(config) -> None:
     """配置日志."""
-    handlers: list[logging.Handler] = [logging.StreamHandler()]
+    level = getattr(logging, config.log_level.upper(), logging.INFO)
+    _configure_root_logging(level, _LOG_FORMAT, _LOG_DATEFMT)
     if config.log_file:
-        handlers.append(logging.FileHandler(config.log_file, encoding="utf-8"))
-    logging.basicConfig(
-        level=getattr(logging, config.log_level.upper(), logging.INFO),
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        datefmt="%H:%M:%S",
-        handlers=handlers,
-    )
-
-
-def cmd_run(args: argparse.Namespace) -> None:
-    """执行任务队列."""
-    config = load_config(Path(args.workspace) if args.workspace else None)
-    if args.workspace:
-        config.workspace = args.workspace
-    if args.workers is not None:
+        root = logging.getLogger()
+        log_path = os.path.abspath(config.log_file)
+        if not any(
+            isinstance(h, logging.FileHandler) and h.baseFilename == log_path
+            for h in root.handlers
+        ):
+            file_handler = logging.FileHandler(config.log_file, encoding="utf-8")
+            file_handler.setFormatter(logging.Formatter(_LOG_FORMAT, datefmt=_LOG_DATEFMT))
+            root.addHandler(file_handler)
+
+
+def _prepare(args: argparse.Namespace) -> tuple[Config, Path]:
+    """加载配置并应用 CLI 覆盖，返回 (config, 已解析的 workspace).
+
+    workspace 只 resolve 一次，并回写到 config.workspace。
+    子命令未定义的覆盖参数（如 list 没有 --workers）会被忽略。
+    """
+    workspace = Path(args.workspace).resolve() if args.workspace else None
+    config = load_config(workspace)
+    if workspace is None:
+        workspace = Path(config.workspace).resolve()
+    config.workspace = str(workspace)
+    if getattr(args, "workers", None) is not None:
         config.max_workers = args.workers
-    if args.no_worktree:
+    if getattr(args, "no_worktree", False):
         config.use_worktree = False
-    if args.plan_mode:
+    if getattr(args, "plan_mode", False):
         config.plan_mode = True
-    if args.docker:
+    if getattr(args, "docker", False):
         config.use_docker = True
-    if args.docker_image:
+    if getattr(args, "docker_image", None):
         config.docker_image = args.docker_image
-    if args.verbose:
+    if getattr(args, "verbose", False):
         config.verbose = True
+    return config, workspace
+
+
+def cmd_run(args: argparse.Namespace) -> None:
+    """执行任务队列."""
+    config, _ = _prepare(args)
+    _setup_logging(config)
     if config.plan_mode and not config.plan_auto_approve:
-        print(
-            "WARNING: plan_auto_approve=False 在 CLI 模式下无法审批（无 Web 服务器），"
+        logger.warning(
+            "plan_auto_approve=False 在 CLI 模式下无法审批（无 Web 服务器），"
             "已自动覆盖为 plan_auto_approve=True"
         )
         config.plan_auto_approve = True
-    _setup_logging(config)
     log_active_config(config)
     run_loop(config)
 
 
 def cmd_serve(args: argparse.Namespace) -> None:
     """启动 Web 管理界面 + 后台任务循环."""
-    config = load_config(Path(args.workspace) if args.workspace else None)
-    if args.workspace:
-        config.workspace = args.workspace
-    if args.workers is not None:
-        config.max_workers = args.workers
-    if args.no_worktree:
-        config.use_worktree = False
-    if args.plan_mode:
-        config.plan_mode = True
-    if args.docker:
-        config.use_docker = True
-    if args.docker_image:
-        config.docker_image = args.docker_image
-    if args.verbose:
-        config.verbose = True
+    # 后台预加载 server 模块（FastAPI/uvicorn 导入较慢），与配置加载、日志初始化并行
+    import_thread = threading.Thread(
+        target=importlib.import_module, args=(".server", __package__),
+        daemon=True, name="vibe-import-server",
+    )
+    import_thread.start()
+
+    config, _ = _prepare(args)
     _setup_logging(config)
     log_active_config(config)
 
+    import_thread.join()
     from .server import start_server
     start_server(config, host=args.host, port=args.port)
 
 
-def cmd_list(args: argparse.Namespace) -> None:
-    """列出任务状态."""
-    config = load_config(Path(args.workspace) if args.workspace else None)
-    if args.workspace:
-        config.workspace = args.workspace
-    workspace = Path(config.workspace).resolve()
-    task_dir = workspace / config.task_dir
-    done_dir = workspace / config.done_dir
-    fail_dir = workspace / config.fail_dir
-
-    print("=== 待执行 (pending) ===")
-    pending = sorted(task_dir.glob("*.md"))
-    for f in pending:
-        print(f"  {f.name}")
-    if not pending:
+def _scan_md(dir_path: Path) -> tuple[list[str], list[str]]:
+    """单次 scandir 扫描目录，返回排序后的 (*.md 文件名, *.md.running.* 文件名).
+
+    目录不存在时返回两个空列表。
+    """
+    pending: list[str] = []
+    running: list[str] = []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                name = entry.name
+                if name.endswith(".md"):
+                    pending.append(name)
+                elif ".md.running." in name:
+                    running.append(name)
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    pending.sort()
+    running.sort()
+    return pending, running
+
+
+def _print_section(title: str, names: list[str]) -> None:
+    print(title)
+    for name in names:
+        print(f"  {name}")
+    if not names:
         print("  (无)")
 
-    print("\n=== 执行中 (running) ===")
-    running = sorted(task_dir.glob("*.md.running.*"))
-    for f in running:
-        print(f"  {f.name}")
-    if not running:
-        print("  (无)")
 
-    print("\n=== 已完成 (done) ===")
-    done = sorted(done_dir.glob("*.md")) if done_dir.is_dir() else []
-    for f in done:
-        print(f"  {f.name}")
-    if not done:
-        print("  (无)")
+def cmd_list(args: argparse.Namespace) -> None:
+    """列出任务状态."""
+    config, workspace = _prepare(args)
+    pending, running = _scan_md(workspace / config.task_dir)
+    done, _ = _scan_md(workspace / config.done_dir)
+    failed, _ = _scan_md(workspace / config.fail_dir)
 
-    print("\n=== 已失败 (failed) ===")
-    failed = sorted(fail_dir.glob("*.md")) if fail_dir.is_dir() else []
-    for f in failed:
-        print(f"  {f.name}")
-    if not failed:
-        print("  (无)")
+    _print_section("=== 待执行 (pending) ===", pending)
+    _print_section("\n=== 执行中 (running) ===", running)
+    _print_section("\n=== 已完成 (done) ===", done)
+    _print_section("\n=== 已失败 (failed) ===", failed)
 
 
 def cmd_add(args: argparse.Namespace) -> None:
     """快速添加任务."""
-    config = load_config(Path(args.workspace) if args.workspace else None)
-    if args.workspace:
-        config.workspace = args.workspace
-    workspace = Path(config.workspace).resolve()
+    config, workspace = _prepare(args)
     task_dir = workspace / config.task_dir
     done_dir = workspace / config.done_dir
     fail_dir = workspace / config.fail_dir
@@ -140,20 +171,18 @@ def cmd_add(args: argparse.Namespace) -> None:
         content += f"<!-- DEPENDS: {', '.join(dep_nums)} -->\n"
     content += args.description + "\n"
 
-    task_file.write_text(content, encoding="utf-8")
+    # 直接写入 UTF-8 字节，跳过文本模式的换行转换与增量编码
+    task_file.write_bytes(content.encode("utf-8"))
     print(f"已添加任务: {filename}")
 
 
 def cmd_retry(args: argparse.Namespace) -> None:
     """重试失败任务 — 清除错误注释，移回任务队列."""
-    config = load_config(Path(args.workspace) if args.workspace else None)
-    if args.workspace:
-        config.workspace = args.workspace
-    workspace = Path(config.workspace).resolve()
+    config, workspace = _prepare(args)
     task_dir = workspace / config.task_dir
     fail_dir = workspace / config.fail_dir
 
-    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    _configure_root_logging(logging.INFO, "%(message)s")
     retried = TaskQueue.retry_failed(task_dir, fail_dir, name=args.name)
     if retried:
         for name in retried:
@@ -165,13 +194,10 @@ def cmd_retry(args: argparse.Namespace) -> None:
 
 def cmd_recover(args: argparse.Namespace) -> None:
     """恢复 .running 文件."""
-    config = load_config(Path(args.workspace) if args.workspace else None)
-    if args.workspace:
-        config.workspace = args.workspace
-    workspace = Path(config.workspace).resolve()
+    config, workspace = _prepare(args)
     task_dir = workspace / config.task_dir
 
-    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    _configure_root_logging(logging.INFO, "%(message)s")
     count = TaskQueue.recover_running(task_dir)
     if count:
         print(f"已恢复 {count} 个任务")
@@ -1,7 +1,7 @@
 """Plan 审批流程 — 同步原语 + 内存存储."""
 
+import secrets
 import threading
-import uuid
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
@@ -11,6 +11,7 @@ class ApprovalDecision(Enum):
     PENDING = "pending"
     APPROVED = "approved"
     REJECTED = "rejected"
+    CANCELLED = "cancelled"
 
 
 @dataclass
@@ -41,16 +42,28 @@ class PendingApproval:
         self.decision = ApprovalDecision.REJECTED
         self._event.set()
 
+    def cancel(self) -> None:
+        """撤销审批（如任务被移除），立即唤醒等待者."""
+        self.decision = ApprovalDecision.CANCELLED
+        self._event.set()
+
 
 class ApprovalStore:
-    """线程安全的审批存储."""
+    """线程安全的审批存储.
+
+    锁只保护 dict 本身；过滤、以及 approve/reject 对单项的修改都在锁外进行
+    （Event.set() 本身线程安全），避免审批决策与列表查询互相阻塞。
+    _pending 只保存尚未决策的项，list_pending 的开销与待审批数量成正比，
+    而不是与全部历史成正比。
+    """
 
     def __init__(self) -> None:
         self._lock = threading.Lock()
         self._items: dict[str, PendingApproval] = {}
+        self._pending: dict[str, PendingApproval] = {}
 
     def submit(self, task_name: str, worker_id: str, plan_text: str) -> PendingApproval:
-        approval_id = uuid.uuid4().hex[:12]
+        approval_id = secrets.token_hex(6)
         item = PendingApproval(
             approval_id=approval_id,
             task_name=task_name,
@@ -59,35 +72,44 @@ class ApprovalStore:
         )
         with self._lock:
             self._items[approval_id] = item
+            self._pending[approval_id] = item
         return item
 
     def get(self, approval_id: str) -> PendingApproval | None:
-        with self._lock:
-            return self._items.get(approval_id)
+        # 单次 dict 读取本身是原子的，无需加锁；同时修改两个 dict 的操作仍需锁
+        return self._items.get(approval_id)
 
     def list_pending(self) -> list[PendingApproval]:
         with self._lock:
-            return [
-                item for item in self._items.values()
-                if item.decision == ApprovalDecision.PENDING
-            ]
+            snapshot = list(self._pending.values())
+        # 仍需过滤: 调用方可能直接调用 item.approve()/reject() 绕过 store
+        return [
+            item for item in snapshot
+            if item.decision == ApprovalDecision.PENDING
+        ]
 
     def approve(self, approval_id: str, feedback: str = "", selections: dict | None = None) -> bool:
         with self._lock:
             item = self._items.get(approval_id)
-            if item is None:
-                return False
-            item.approve(feedback=feedback, selections=selections or {})
-            return True
+            self._pending.pop(approval_id, None)
+        if item is None:
+            return False
+        item.approve(feedback=feedback, selections=selections or {})
+        return True
 
     def reject(self, approval_id: str) -> bool:
         with self._lock:
             item = self._items.get(approval_id)
-            if item is None:
-                return False
-            item.reject()
-            return True
+            self._pending.pop(approval_id, None)
+        if item is None:
+            return False
+        item.reject()
+        return True
 
     def remove(self, approval_id: str) -> None:
+        """移除审批；若仍未决策则标记为 CANCELLED 并唤醒等待者."""
         with self._lock:
-            self._items.pop(approval_id, None)
+            item = self._items.pop(approval_id, None)
+            self._pending.pop(approval_id, None)
+        if item is not None and item.decision == ApprovalDecision.PENDING:
+            item.cancel()
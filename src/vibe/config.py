@@ -1,9 +1,14 @@
 """集中配置 — 从默认值 / .env / 环境变量加载."""
 
+import functools
 import logging
 import os
-from dataclasses import dataclass, fields
+import re
+import stat
+from collections.abc import Callable
+from dataclasses import dataclass, fields, replace
 from pathlib import Path
+from typing import get_type_hints
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +44,26 @@ class Config:
 
 _ENV_PREFIX = "VIBE_"
 
+# 解析后的真实类型（f.type 在 `from __future__ import annotations` 下会是字符串）
+_TYPES: dict[str, type] = get_type_hints(Config)
+
+# 预计算字段元数据: (带前缀键, 无前缀键, 字段名, 类型)，避免每次加载时反射 + 拼接字符串
+_FIELD_TABLE: tuple[tuple[str, str, str, type], ...] = tuple(
+    (_ENV_PREFIX + f.name.upper(), f.name.upper(), f.name, _TYPES[f.name])
+    for f in fields(Config)
+)
+
+# 单次扫描 .env: KEY=value / KEY="value" / KEY='value'，可带行尾注释（# 前需有空白）
+_DOTENV_RE = re.compile(
+    r"""^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*"""
+    r"""(?:"([^"\r\n]*)"|'([^'\r\n]*)'|([^\r\n]*?))"""
+    r"""[ \t]*(?:(?<=[ \t])#[^\r\n]*)?\r?$""",
+    re.MULTILINE,
+)
+
+# .env 解析缓存: 路径 → ((mtime_ns, size), 解析结果)
+_DOTENV_CACHE: dict[str, tuple[tuple[int, int], dict[str, str]]] = {}
+
 
 def _parse_dotenv(path: Path) -> dict[str, str]:
     """解析 .env 文件，返回键值对.
@@ -47,75 +72,131 @@ def _parse_dotenv(path: Path) -> dict[str, str]:
       KEY=value
       KEY="value"
       KEY='value'
+      KEY=value  # 行尾注释
       # 注释行
       空行
+
+    按 (mtime_ns, size) 缓存，文件未变时不重新读取。返回副本，调用方可修改。
     """
-    result: dict[str, str] = {}
-    if not path.is_file():
-        return result
-    for line in path.read_text(encoding="utf-8").splitlines():
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-        if "=" not in line:
-            continue
-        key, _, value = line.partition("=")
-        key = key.strip()
-        value = value.strip()
-        # 去掉引号
-        if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
-            value = value[1:-1]
-        result[key] = value
-    return result
+    try:
+        st = path.stat()
+    except OSError:
+        return {}
+    if not stat.S_ISREG(st.st_mode):
+        return {}
+    key = str(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _DOTENV_CACHE.get(key)
+    if cached is not None and cached[0] == stamp:
+        return dict(cached[1])
+    result = {
+        m.group(1): m.group(2) or m.group(3) or m.group(4) or ""
+        for m in _DOTENV_RE.finditer(path.read_text(encoding="utf-8"))
+    }
+    _DOTENV_CACHE[key] = (stamp, result)
+    return dict(result)
+
+
+def _coerce_bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+_COERCERS: dict[type, Callable[[str], object]] = {
+    int: int,
+    bool: _coerce_bool,
+    str: str,
+}
 
 
 def _coerce(value: str, target_type: type, field_name: str = "") -> object | None:
     """将字符串值转换为目标类型. 转换失败返回 None."""
-    if target_type is int:
-        try:
-            return int(value)
-        except (ValueError, TypeError):
-            logger.warning("配置项 %s 值 %r 无法转为 int，保留默认值", field_name, value)
-            return None
-    if target_type is bool:
-        return value.lower() in ("1", "true", "yes")
-    return value
+    coercer = _COERCERS.get(target_type, str)
+    try:
+        return coercer(value)
+    except (ValueError, TypeError):
+        logger.warning(
+            "配置项 %s 值 %r 无法转为 %s，保留默认值",
+            field_name, value, getattr(target_type, "__name__", target_type),
+        )
+        return None
+
+
+def _dotenv_stamp(path: Path) -> tuple[int, int] | None:
+    """返回 .env 文件的 (mtime_ns, size)，用作缓存键. 文件不存在返回 None."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
 
 
 def load_config(workspace: Path | None = None) -> Config:
     """加载配置: 默认值 → CWD/.env → workspace/.env → 环境变量.
 
+    结果按 (CWD, workspace, 两个 .env 的 mtime/size, VIBE_ 环境变量) 缓存，
+    同一进程内重复调用不再重新读取和解析。每次返回独立副本，调用方可自由修改。
+
     Args:
         workspace: 工作目录，用于查找 .env 文件
     """
-    config = Config()
-
+    cwd = Path.cwd()
     if workspace is None:
-        workspace = Path.cwd()
+        workspace = cwd
+    ws_resolved = workspace.resolve()
+    env_items = frozenset(
+        (k, v) for k, v in os.environ.items() if k.startswith(_ENV_PREFIX)
+    )
+    cached = _load_config_cached(
+        str(cwd),
+        str(ws_resolved),
+        _dotenv_stamp(cwd / ".env"),
+        _dotenv_stamp(ws_resolved / ".env"),
+        env_items,
+    )
+    return replace(cached)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(
+    cwd_str: str,
+    ws_str: str,
+    cwd_stamp: tuple[int, int] | None,
+    ws_stamp: tuple[int, int] | None,
+    env_items: frozenset[tuple[str, str]],
+) -> Config:
+    """load_config 的缓存实现. stamp 参数仅作为缓存键，使 .env 变更后失效.
+
+    返回值被缓存共享，调用方不得修改（load_config 负责复制）。
+    """
+    config = Config()
+    environ = dict(env_items)
 
     # 1. CWD 的 .env（基础）
-    cwd = Path.cwd()
+    cwd = Path(cwd_str)
     dotenv = _parse_dotenv(cwd / ".env")
 
     # 2. workspace 的 .env（覆盖，如果 workspace != cwd）
-    ws_resolved = workspace.resolve()
+    ws_resolved = Path(ws_str)
     if ws_resolved != cwd.resolve():
         ws_dotenv = _parse_dotenv(ws_resolved / ".env")
         dotenv.update(ws_dotenv)
 
+    # 无任何覆盖来源 → 直接返回默认值（默认值本身无需范围校验）
+    if not dotenv and not environ:
+        return config
+
     # 3. 合并 .env 和环境变量（环境变量最终覆盖）
-    for f in fields(Config):
-        env_key = _ENV_PREFIX + f.name.upper()  # e.g. "VIBE_PLAN_MODE"
-        bare_key = f.name.upper()                # e.g. "PLAN_MODE"
+    for env_key, bare_key, name, ftype in _FIELD_TABLE:
+        # env_key e.g. "VIBE_PLAN_MODE", bare_key e.g. "PLAN_MODE"
         # .env: 无前缀 fallback，有前缀优先
         raw = dotenv.get(bare_key)
         raw = dotenv.get(env_key, raw)
         # 环境变量覆盖（仍要求 VIBE_ 前缀，避免与其他工具冲突）
-        raw = os.environ.get(env_key, raw)
+        raw = environ.get(env_key, raw)
         if raw is not None:
-            coerced = _coerce(raw, f.type, f.name)
+            coerced = _coerce(raw, ftype, name)
             if coerced is not None:
-                setattr(config, f.name, coerced)
+                setattr(config, name, coerced)
 
     # 范围校验
     if config.timeout <= 0:
@@ -6,13 +6,13 @@ import atexit
 import logging
 import signal
 from collections.abc import Callable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
 from pathlib import Path
 
 from .approval import ApprovalStore
 from .config import Config
 from .manager import check_docker_available, ensure_docker_image
-from .task import TaskQueue
+from .task import TaskQueue, _list_md_names
 from .worker import shutdown_event, worker_loop
 from .worker import update_worker_status
 from .worktree import (
@@ -88,15 +88,14 @@ def run_loop(
     if continuous:
         logger.info("持续轮询模式已启用，间隔: %d 秒", config.poll_interval)
 
-    queue = TaskQueue(config, workspace)
-
     while True:
         # 检查是否收到关闭信号
         if shutdown_event.is_set():
             break
 
         # 检查是否有待执行任务
-        pending = sorted(task_dir.glob("*.md"))
+        # 与 claim_next 使用相同的过滤规则，隐藏文件/子目录不会触发空批次
+        pending = [task_dir / name for name in _list_md_names(task_dir)]
         if not pending:
             if not continuous:
                 logger.info("没有待执行的任务，退出")
@@ -107,17 +106,17 @@ def run_loop(
             continue
 
         logger.info("发现 %d 个待执行任务", len(pending))
+        # 复用本轮扫描结果，worker 首次认领无需再次扫描目录
+        queue = TaskQueue(config, workspace, initial_pending=pending)
 
-        use_wt = (
-            config.max_workers > 1
-            and config.use_worktree
-            and is_git_repo(workspace)
-        )
+        # is_git_repo 需要启动 git 子进程，每批次最多探测一次
+        want_wt = config.max_workers > 1 and config.use_worktree
+        use_wt = want_wt and is_git_repo(workspace)
 
         if use_wt:
             logger.info("Git worktree 模式启用，为每个 worker 创建隔离工作树")
             cleanup_stale_worktrees(workspace)
-        elif config.max_workers > 1 and config.use_worktree and not is_git_repo(workspace):
+        elif want_wt:
             logger.warning(
                 "工作目录不是 git 仓库，无法使用 worktree 隔离。"
                 "多 worker 将共享同一目录，可能产生冲突！"
@@ -172,22 +171,26 @@ def _run_with_worktrees(
     每个任务完成后立即 rebase + ff-merge（per-task merge），
     而非等所有 worker 完成后批量合并。
     """
-    worktrees: dict[str, Path] = {}
+    # 1. 并行为每个 worker 创建 worktree（git worktree add 耗时在子进程 I/O 上）
+    wids = [f"w{i}" for i in range(config.max_workers)]
+    with ThreadPoolExecutor(max_workers=len(wids)) as pool:
+        create_futures = {wid: pool.submit(create_worktree, workspace, wid) for wid in wids}
 
-    # 1. 为每个 worker 创建 worktree
-    for i in range(config.max_workers):
-        wid = f"w{i}"
+    worktrees: dict[str, Path] = {}
+    create_failed = False
+    for wid, fut in create_futures.items():
         try:
-            wt_path = create_worktree(workspace, wid)
-            worktrees[wid] = wt_path
+            worktrees[wid] = fut.result()
         except RuntimeError as e:
             logger.error("为 %s 创建 worktree 失败: %s", wid, e)
-            # 清理已创建的 worktree 并降级
-            for created_wid, created_path in worktrees.items():
-                remove_worktree(workspace, created_path)
-            logger.warning("降级为共享 workspace 模式")
-            _run_shared(config, queue, approval_store=approval_store, on_task_complete=on_task_complete, history=history)
-            return
+            create_failed = True
+    if create_failed:
+        # 清理已创建的 worktree 并降级
+        for created_path in worktrees.values():
+            remove_worktree(workspace, created_path)
+        logger.warning("降级为共享 workspace 模式")
+        _run_shared(config, queue, approval_store=approval_store, on_task_complete=on_task_complete, history=history)
+        return
 
     # 2. 创建合并协调器（传入冲突解决配置）
     coordinator = MergeCoordinator(
@@ -227,24 +230,35 @@ def _run_with_worktrees(
         return cb
 
     # 5. 启动 workers（传入 on_task_success + on_before_task）
+    #    每个 worker 退出后立即移除自己的 worktree，与仍在运行的 worker 重叠，
+    #    而不是等全部结束后再串行清理
+    pending_cleanup = dict(worktrees)
+
+    def _run_worker(wid: str, wt_path: Path) -> None:
+        try:
+            worker_loop(
+                wid, config, queue, wt_path,
+                approval_store=approval_store,
+                on_task_complete=on_task_complete,
+                on_task_success=_make_merge_cb(wid, wt_path),
+                on_before_task=_make_sync_cb(wt_path),
+                history=history,
+            )
+        finally:
+            if pending_cleanup.pop(wid, None) is not None:
+                remove_worktree(workspace, wt_path)
+
     try:
         with ThreadPoolExecutor(max_workers=config.max_workers) as pool:
-            futures = {
-                pool.submit(
-                    worker_loop, wid, config, queue, wt_path,
-                    approval_store=approval_store,
-                    on_task_complete=on_task_complete,
-                    on_task_success=_make_merge_cb(wid, wt_path),
-                    on_before_task=_make_sync_cb(wt_path),
-                    history=history,
-                ): wid
+            futures = [
+                pool.submit(_run_worker, wid, wt_path)
                 for wid, wt_path in worktrees.items()
-            }
-            for f in as_completed(futures):
-                f.result()  # 传播异常
+            ]
+            _wait_fail_fast(futures)
     finally:
-        # 6. 无条件清理所有 worktrees（合并已在 per-task 回调中完成）
-        for wid, wt_path in worktrees.items():
+        # 6. 兜底清理未被 worker 自行清理的 worktrees（如被取消未启动的 worker）
+        for wid, wt_path in list(pending_cleanup.items()):
+            pending_cleanup.pop(wid, None)
             remove_worktree(workspace, wt_path)
 
 
@@ -266,5 +280,25 @@ def _run_shared(
             )
             for i in range(config.max_workers)
         ]
-        for f in as_completed(futures):
-            f.result()  # 传播异常
+        _wait_fail_fast(futures)
+
+
+def _wait_fail_fast(futures: list[Future]) -> None:
+    """等待所有 worker 结束；任一 worker 抛异常时立即通知其余 worker 停止并传播异常.
+
+    其余 worker 通过 shutdown_event 走优雅关闭路径（终止子进程、释放任务回队列），
+    避免在已失败的运行上继续消耗时间。
+
+    shutdown_event 是进程级的，且不会被清除：异常传播出 run_loop 后，
+    serve 模式的后台任务循环同样随之结束，之后在本进程内启动的 run_loop
+    也会立即退出，需要重启进程才能继续处理任务。
+    """
+    done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+    if not_done:
+        # FIRST_EXCEPTION 提前返回 → 已有 worker 异常退出
+        logger.error("Worker 异常退出，通知其余 %d 个 worker 停止", len(not_done))
+        for f in not_done:
+            f.cancel()
+        shutdown_event.set()
+    for f in done:
+        f.result()  # 传播异常
@@ -1,12 +1,16 @@
 """Claude Code 进程管理 — 启动、监控、解析结果."""
 
+import functools
+import io
 import json
 import logging
 import os
+import selectors
 import shlex
 import subprocess
 import threading
 import time
+from collections import deque
 from collections.abc import Callable
 from dataclasses import dataclass, field
 from pathlib import Path
@@ -16,7 +20,7 @@ logger = logging.getLogger(__name__)
 DEFAULT_TIMEOUT = 600  # 10 分钟
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskResult:
     """Claude Code 单次执行的结构化结果."""
 
@@ -31,98 +35,266 @@ class TaskResult:
     result_text: str = ""
 
 
+_EDIT_TOOLS = frozenset({"Write", "Edit", "write", "edit"})
+
+# 关心的事件类型；不含任何一个的行不会命中事件处理器
+_EVENT_MARKERS = ('"assistant"', '"tool_use"', '"tool_result"', '"result"')
+# CLI 自身输出的 system 事件前缀；形状确定，不含关心的事件类型时可跳过解析
+_SYSTEM_EVENT_PREFIXES = ('{"type":"system"', '{"type": "system"')
+
+try:
+    # orjson 在 C 中直接解码，小对象解析快数倍；其 JSONDecodeError 是 json.JSONDecodeError 的子类
+    from orjson import loads as _decode_json
+except ImportError:
+    # 复用同一个解码器，省去 json.loads 每次调用的参数检查与对象构造
+    _decode_json = json.JSONDecoder().decode
+
+
+class _StreamParser:
+    """增量解析 Claude Code stream-json 输出.
+
+    读取线程每读到一行就调用 feed()，只保留文本、工具调用、工具结果和最终结果，
+    不再持有完整的原始输出。
+    """
+
+    def __init__(self) -> None:
+        self._output = io.StringIO()
+        self._has_output = False
+        self.tool_calls: list[dict] = []
+        self.tool_results: list[dict] = []
+        self.files_changed: list[str] = []
+        self._seen_files: set[str] = set()
+        self.result_text: str = ""
+
+    def feed(self, line: str) -> None:
+        """解析一行输出并合并到当前结果."""
+        line = line.strip()
+        if not line:
+            return
+        if line[0] != "{":
+            # 事件总是 JSON 对象，其他行直接当作普通输出，无需尝试解析
+            self._add_output(line)
+            return
+        if (
+            line[-1] == "}"
+            and line.startswith(_SYSTEM_EVENT_PREFIXES)
+            and not any(marker in line for marker in _EVENT_MARKERS)
+        ):
+            return  # system 事件无需解析；其余无法确定的行交给解码器判断
+        try:
+            event = _decode_json(line)
+        except json.JSONDecodeError:
+            # 非 JSON 行，当作普通输出
+            self._add_output(line)
+            return
+
+        event_type = event.get("type")
+        if isinstance(event_type, str):
+            handler = self._HANDLERS.get(event_type)
+            if handler is not None:
+                handler(self, event)
+
+    def _on_assistant(self, event: dict) -> None:
+        # 单次遍历 content，同时提取文本输出和工具调用
+        message = event.get("message")
+        if not isinstance(message, dict):
+            return
+        for block in message.get("content", ()):
+            if not isinstance(block, dict):
+                continue
+            block_type = block.get("type")
+            if block_type == "text":
+                self._add_output(block["text"])
+            elif block_type == "tool_use":
+                self._add_tool_call(block)
+
+    def _on_tool_use(self, event: dict) -> None:
+        self._add_tool_call(event)
+
+    def _on_tool_result(self, event: dict) -> None:
+        self.tool_results.append(event)
+
+    def _on_result(self, event: dict) -> None:
+        result_data = event.get("result", "")
+        if isinstance(result_data, str):
+            self._add_output(result_data)
+            self.result_text = result_data
+
+    _HANDLERS: dict[str, Callable[["_StreamParser", dict], None]] = {
+        "assistant": _on_assistant,
+        "tool_use": _on_tool_use,
+        "tool_result": _on_tool_result,
+        "result": _on_result,
+    }
+
+    def _add_output(self, text: str) -> None:
+        # 直接写入缓冲区，结束时无需再 join 一份 list
+        if self._has_output:
+            self._output.write("\n")
+        self._has_output = True
+        self._output.write(text)
+
+    def _add_tool_call(self, tc: dict) -> None:
+        self.tool_calls.append(tc)
+        # 从工具调用中提取文件变更
+        name = tc.get("name")
+        if not isinstance(name, str) or name not in _EDIT_TOOLS:
+            return
+        tool_input = tc.get("input")
+        if (
+            isinstance(tool_input, dict)
+            and (fpath := tool_input.get("file_path"))
+            and fpath not in self._seen_files
+        ):
+            self._seen_files.add(fpath)
+            self.files_changed.append(fpath)
+
+    def result(self) -> TaskResult:
+        """根据已解析的内容生成 TaskResult（success=True）."""
+        return TaskResult(
+            success=True,
+            output=self._output.getvalue(),
+            files_changed=list(self.files_changed),
+            tool_calls=list(self.tool_calls),
+            tool_results=list(self.tool_results),
+            result_text=self.result_text,
+        )
+
+
+_READ_CHUNK = 65536
+_STDERR_MAX_LINES = 2000  # 错误信息只保留 stderr 末尾这么多行
+
+
+class _LineReader:
+    """把分块读取的字节切分成行，分发给 lines / parser / on_line.
+
+    每块中的完整行一次性解码后再切分，不完整的末尾留在缓冲区等待下一块。
+    """
+
+    def __init__(
+        self,
+        lines: list[str] | deque[str] | None,
+        on_line: Callable[[str], None] | None = None,
+        parser: _StreamParser | None = None,
+    ) -> None:
+        self._lines = lines
+        self._on_line = on_line
+        self._parser = parser
+        self._buf = bytearray()
+
+    def feed(self, chunk: bytes) -> None:
+        buf = self._buf
+        buf += chunk
+        # "\n" 不会出现在多字节 UTF-8 序列中，按最后一个换行切分可安全解码
+        idx = buf.rfind(b"\n")
+        if idx < 0:
+            return
+        text = buf[:idx].decode("utf-8", errors="replace")
+        del buf[:idx + 1]
+        for line in text.split("\n"):
+            self._emit(line)
+
+    def flush(self) -> None:
+        """输出流结束时处理末尾不带换行的行."""
+        if self._buf:
+            self._emit(self._buf.decode("utf-8", errors="replace"))
+            self._buf.clear()
+
+    def _emit(self, line: str) -> None:
+        if self._lines is not None:
+            self._lines.append(line)
+        if self._parser is not None:
+            try:
+                self._parser.feed(line)
+            except Exception:
+                logger.debug("stream-json 行解析失败", exc_info=True)
+        if self._on_line is not None:
+            try:
+                self._on_line(line)
+            except Exception:
+                pass  # never crash the reader thread
+
+
+def _drain(stream, reader: _LineReader) -> None:
+    """阻塞读取 stream 直到 EOF."""
+    try:
+        while chunk := stream.read(_READ_CHUNK):
+            reader.feed(chunk)
+        reader.flush()
+    finally:
+        stream.close()
+
+
 def _read_stream(
     stream,
-    lines: list[str],
+    lines: list[str] | None,
     on_line: Callable[[str], None] | None = None,
+    parser: _StreamParser | None = None,
 ) -> None:
-    """在线程中读取子进程的输出流."""
+    """读取子进程的单个输出流.
+
+    lines 为 None 时不保留原始行；提供 parser 时边读边解析。
+    按 64KiB 块读取（stream 应为无缓冲的原始流）。
+    """
+    _drain(stream, _LineReader(lines, on_line, parser))
+
+
+def _read_streams(readers: list[tuple[object, _LineReader]]) -> None:
+    """在单个线程中用 selectors 同时读取多个输出流，直到全部 EOF.
+
+    没有文件描述符的流（如内存流）无法注册到 selector，直接顺序读完。
+    """
+    sel = selectors.DefaultSelector()
     try:
-        for raw_line in stream:
-            line = raw_line.decode("utf-8", errors="replace").rstrip("\n")
-            lines.append(line)
-            if on_line is not None:
-                try:
-                    on_line(line)
-                except Exception:
-                    pass  # never crash the reader thread
+        for stream, reader in readers:
+            try:
+                sel.register(stream, selectors.EVENT_READ, reader)
+            except (ValueError, OSError):
+                _drain(stream, reader)
+        while sel.get_map():
+            for key, _ in sel.select():
+                stream = key.fileobj
+                chunk = stream.read(_READ_CHUNK)
+                if chunk:
+                    key.data.feed(chunk)
+                    continue
+                sel.unregister(stream)
+                stream.close()
+                key.data.flush()
     finally:
-        stream.close()
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        sel.close()
 
 
 def _parse_stream_json(lines: list[str]) -> TaskResult:
     """解析 Claude Code stream-json 输出，提取结构化信息."""
-    output_parts: list[str] = []
-    files_changed: list[str] = []
-    tool_calls: list[dict] = []
-    tool_results: list[dict] = []
-    result_text: str = ""
-
+    parser = _StreamParser()
     for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            event = json.loads(line)
-        except json.JSONDecodeError:
-            # 非 JSON 行，当作普通输出
-            output_parts.append(line)
-            continue
-
-        event_type = event.get("type", "")
-
-        # 提取助手文本输出
-        if event_type == "assistant" and "message" in event:
-            message = event["message"]
-            if isinstance(message, dict):
-                for block in message.get("content", []):
-                    if isinstance(block, dict) and block.get("type") == "text":
-                        output_parts.append(block["text"])
-
-        # 提取工具结果
-        if event_type == "tool_result":
-            tool_results.append(event)
-
-        # 提取工具调用信息
-        if event_type == "tool_use":
-            tool_calls.append(event)
-        elif event_type == "assistant" and "message" in event:
-            message = event["message"]
-            if isinstance(message, dict):
-                for block in message.get("content", []):
-                    if isinstance(block, dict) and block.get("type") == "tool_use":
-                        tool_calls.append(block)
-
-        # 提取文件变更 + 最终结果文本
-        if event_type == "result":
-            result_data = event.get("result", "")
-            if isinstance(result_data, str):
-                output_parts.append(result_data)
-                result_text = result_data
-
-    # 从工具调用中提取文件变更
-    for tc in tool_calls:
-        tool_name = tc.get("name", "")
-        tool_input = tc.get("input", {})
-        if tool_name in ("Write", "Edit", "write", "edit") and "file_path" in tool_input:
-            fpath = tool_input["file_path"]
-            if fpath not in files_changed:
-                files_changed.append(fpath)
-
-    output = "\n".join(output_parts)
-    return TaskResult(
-        success=True,
-        output=output,
-        files_changed=files_changed,
-        tool_calls=tool_calls,
-        tool_results=tool_results,
-        result_text=result_text,
-    )
+        parser.feed(line)
+    return parser.result()
 
 
 # ── Docker 支持 ─────────────────────────────────────────────
 
 
+@functools.lru_cache(maxsize=32)
+def _docker_static_args(
+    docker_image: str,
+    docker_extra_args: str = "",
+) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """返回 docker run 中进程内不变的部分: (--user 参数, 额外参数 + 镜像名).
+
+    UID/GID、镜像名和额外参数在进程内不会变化，按参数缓存，
+    同一批任务重复调用时省去 getuid 和 shlex 解析。
+    """
+    # UID=0 时跳过 --user（Claude CLI 拒绝 root + --dangerously-skip-permissions）
+    uid = os.getuid()
+    user_args = ("--user", f"{uid}:{os.getgid()}") if uid != 0 else ()
+    tail = (*shlex.split(docker_extra_args), docker_image)
+    return user_args, tail
+
+
 def _build_docker_cmd(
     claude_cmd: list[str],
     cwd: Path,
@@ -131,12 +303,15 @@ def _build_docker_cmd(
 ) -> list[str]:
     """将 claude 命令包装为 docker run 命令.
 
+    home 与 ~/.claude.json 每次调用时重新检查（serve 长期运行期间可能新建该文件）。
+
     Args:
         claude_cmd: 原始 claude CLI 命令列表
         cwd: 宿主机工作目录（挂载到 /workspace）
         docker_image: Docker 镜像名称
         docker_extra_args: 额外 docker run 参数字符串
     """
+    user_args, tail = _docker_static_args(docker_image, docker_extra_args)
     home = Path.home()
     cmd = [
         "docker", "run",
@@ -146,19 +321,13 @@ def _build_docker_cmd(
         "-w", "/workspace",
         "-e", "HOME=/home/user",
         "-e", "ANTHROPIC_API_KEY",
+        *user_args,
     ]
-    # UID=0 时跳过 --user（Claude CLI 拒绝 root + --dangerously-skip-permissions）
-    uid = os.getuid()
-    if uid != 0:
-        gid = os.getgid()
-        cmd.extend(["--user", f"{uid}:{gid}"])
     # 挂载 ~/.claude.json（如果存在）
     claude_json = home / ".claude.json"
     if claude_json.is_file():
         cmd.extend(["-v", f"{claude_json}:/home/user/.claude.json"])
-    if docker_extra_args:
-        cmd.extend(shlex.split(docker_extra_args))
-    cmd.append(docker_image)
+    cmd.extend(tail)
     cmd.extend(claude_cmd)
     return cmd
 
@@ -187,9 +356,15 @@ def check_docker_available() -> tuple[bool, str]:
         return False, f"Docker 检查失败: {e}"
 
 
+# 本进程内已确认存在（或已构建成功）的镜像，后续调用跳过 docker image inspect
+_READY_IMAGES: set[str] = set()
+
+
 def ensure_docker_image(image: str, dockerfile_dir: str | Path = ".") -> tuple[bool, str]:
     """检查镜像是否存在，不存在时尝试自动构建.
 
+    成功结果按镜像名缓存，失败不缓存（下次仍会重新检查）。
+
     Args:
         image: 镜像名称
         dockerfile_dir: Dockerfile 所在目录
@@ -197,6 +372,9 @@ def ensure_docker_image(image: str, dockerfile_dir: str | Path = ".") -> tuple[b
     Returns:
         (成功, 消息) 元组
     """
+    if image in _READY_IMAGES:
+        return True, f"镜像 {image} 已存在"
+
     # 检查镜像是否已存在
     try:
         result = subprocess.run(
@@ -205,6 +383,7 @@ def ensure_docker_image(image: str, dockerfile_dir: str | Path = ".") -> tuple[b
             timeout=10,
         )
         if result.returncode == 0:
+            _READY_IMAGES.add(image)
             return True, f"镜像 {image} 已存在"
     except (FileNotFoundError, subprocess.TimeoutExpired, OSError):
         return False, "docker 命令不可用"
@@ -222,6 +401,7 @@ def ensure_docker_image(image: str, dockerfile_dir: str | Path = ".") -> tuple[b
             timeout=600,
         )
         if result.returncode == 0:
+            _READY_IMAGES.add(image)
             return True, f"镜像 {image} 构建成功"
         stderr = result.stderr.decode("utf-8", errors="replace").strip()
         return False, f"镜像 {image} 构建失败: {stderr}"
@@ -234,6 +414,58 @@ def ensure_docker_image(image: str, dockerfile_dir: str | Path = ".") -> tuple[b
 # ── 公共子进程管理 ──────────────────────────────────────────
 
 
+# 每个 shutdown_event 对应一组正在运行的子进程（Popen -> terminated 标记）
+_live_procs: dict[threading.Event, dict[subprocess.Popen, threading.Event]] = {}
+_live_procs_lock = threading.Lock()
+
+
+def _register_proc(
+    shutdown_event: threading.Event,
+    proc: subprocess.Popen,
+    terminated: threading.Event,
+) -> None:
+    """登记运行中的子进程；该 shutdown_event 首次登记时启动唯一的监听线程."""
+    with _live_procs_lock:
+        procs = _live_procs.get(shutdown_event)
+        if procs is None:
+            procs = _live_procs[shutdown_event] = {}
+            threading.Thread(
+                target=_watch_shutdown, args=(shutdown_event,),
+                daemon=True, name="vibe-shutdown-watch",
+            ).start()
+        procs[proc] = terminated
+
+
+def _unregister_proc(shutdown_event: threading.Event, proc: subprocess.Popen) -> None:
+    """子进程结束（或已按超时处理）后注销."""
+    with _live_procs_lock:
+        procs = _live_procs.get(shutdown_event)
+        if procs is not None:
+            procs.pop(proc, None)
+
+
+def _watch_shutdown(shutdown_event: threading.Event) -> None:
+    """进程级监听线程：无超时阻塞等待关闭信号，然后终止所有已登记的子进程.
+
+    先对全部存活子进程发 SIGTERM，5 秒后仍未退出的再 SIGKILL。
+    处理完即退出；之后再登记的子进程会启动新的监听线程（信号已 set 时立即处理）。
+    """
+    shutdown_event.wait()
+    with _live_procs_lock:
+        procs = _live_procs.pop(shutdown_event, {})
+    alive = [proc for proc in procs if proc.poll() is None]  # 已正常退出的不算中断
+    if alive:
+        logger.warning("收到关闭信号，终止 %d 个子进程", len(alive))
+    for proc in alive:
+        procs[proc].set()
+        proc.terminate()
+    for proc in alive:
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
 def _run_claude(
     cmd: list[str],
     cwd: Path,
@@ -247,7 +479,7 @@ def _run_claude(
 ) -> TaskResult:
     """执行 claude 命令的公共子进程管理逻辑.
 
-    处理 Popen 启动、双线程读取 stdout/stderr、超时、结果解析。
+    处理 Popen 启动、单个线程经 selector 同时读取 stdout/stderr（_read_streams）、超时、结果解析。
     当 use_docker=True 时自动将命令包装为 docker run。
 
     Args:
@@ -267,8 +499,13 @@ def _run_claude(
 
     start_time = time.monotonic()
 
-    # 清除 CLAUDECODE 环境变量，允许嵌套调用（从 Claude Code 会话内启动子进程）
-    env = {k: v for k, v in os.environ.items() if k != "CLAUDECODE"}
+    # 清除 CLAUDECODE 环境变量，允许嵌套调用（从 Claude Code 会话内启动子进程）；
+    # Docker 模式下容器只接收 -e 显式传入的变量，直接继承父进程环境即可
+    if use_docker:
+        env = None
+    else:
+        env = os.environ.copy()
+        env.pop("CLAUDECODE", None)
 
     logger.debug("执行命令: %s", " ".join(actual_cmd))
     if use_docker:
@@ -280,6 +517,7 @@ def _run_claude(
             stdin=subprocess.DEVNULL,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
+            bufsize=0,  # 原始管道，_read_stream 自行分块读取
             cwd=proc_cwd,
             env=env,
             start_new_session=True,  # 防止 SIGINT 传播到子进程
@@ -294,84 +532,69 @@ def _run_claude(
 
     logger.info("子进程已启动, PID=%d", proc.pid)
 
-    # 使用线程读取 stdout 和 stderr，避免死锁
-    stdout_lines: list[str] = []
-    stderr_lines: list[str] = []
+    # 单个线程通过 selector 同时读取 stdout 和 stderr，避免死锁
+    stdout_parser = _StreamParser()
+    stderr_lines: deque[str] = deque(maxlen=_STDERR_MAX_LINES)
 
     def _stderr_logger(line: str) -> None:
         if line.strip():
             logger.warning("stderr: %s", line)
 
-    stdout_thread = threading.Thread(
-        target=_read_stream, args=(proc.stdout, stdout_lines, on_output), daemon=True,
-    )
-    stderr_thread = threading.Thread(
-        target=_read_stream, args=(proc.stderr, stderr_lines, _stderr_logger), daemon=True,
+    reader_thread = threading.Thread(
+        target=_read_streams,
+        args=([
+            (proc.stdout, _LineReader(None, on_output, stdout_parser)),
+            (proc.stderr, _LineReader(stderr_lines, _stderr_logger)),
+        ],),
+        daemon=True,
     )
-    stdout_thread.start()
-    stderr_thread.start()
+    reader_thread.start()
 
-    # 轮询等待子进程结束，每 0.5s 检查一次 shutdown_event
-    deadline = start_time + timeout
-    poll_interval = 0.5
+    # 阻塞等待子进程结束；关闭信号由进程级监听线程统一处理，无需轮询
+    terminated = threading.Event()
+    if shutdown_event is not None:
+        _register_proc(shutdown_event, proc, terminated)
 
-    while True:
-        try:
-            proc.wait(timeout=poll_interval)
-            break  # 子进程已结束
-        except subprocess.TimeoutExpired:
-            pass
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if shutdown_event is not None:
+            _unregister_proc(shutdown_event, proc)
+        duration = time.monotonic() - start_time
+        logger.warning("执行超时（%d 秒），终止进程", timeout)
+        proc.kill()
+        proc.wait()
+        reader_thread.join(timeout=5)
+        if reader_thread.is_alive():
+            logger.warning("输出读取线程在 join 超时后仍在运行")
+        parsed = stdout_parser.result()
+        parsed.success = False
+        parsed.error = f"执行超时（{timeout} 秒）"
+        parsed.duration_seconds = duration
+        parsed.return_code = None
+        return parsed
+    if shutdown_event is not None:
+        _unregister_proc(shutdown_event, proc)
 
-        # 检查关闭信号
-        if shutdown_event is not None and shutdown_event.is_set():
-            duration = time.monotonic() - start_time
-            logger.warning("收到关闭信号，终止子进程")
-            proc.terminate()
-            try:
-                proc.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                proc.kill()
-                proc.wait()
-            stdout_thread.join(timeout=5)
-            stderr_thread.join(timeout=5)
-            parsed = _parse_stream_json(stdout_lines)
-            parsed.success = False
-            parsed.error = "中断: 收到关闭信号"
-            parsed.duration_seconds = duration
-            parsed.return_code = proc.returncode
-            return parsed
-
-        # 检查超时
-        if time.monotonic() >= deadline:
-            duration = time.monotonic() - start_time
-            logger.warning("执行超时（%d 秒），终止进程", timeout)
-            proc.kill()
-            proc.wait()
-            stdout_thread.join(timeout=5)
-            if stdout_thread.is_alive():
-                logger.warning("stdout 读取线程在 join 超时后仍在运行")
-            stderr_thread.join(timeout=5)
-            if stderr_thread.is_alive():
-                logger.warning("stderr 读取线程在 join 超时后仍在运行")
-            parsed = _parse_stream_json(stdout_lines)
-            parsed.success = False
-            parsed.error = f"执行超时（{timeout} 秒）"
-            parsed.duration_seconds = duration
-            parsed.return_code = None
-            return parsed
+    if terminated.is_set():
+        duration = time.monotonic() - start_time
+        reader_thread.join(timeout=5)
+        parsed = stdout_parser.result()
+        parsed.success = False
+        parsed.error = "中断: 收到关闭信号"
+        parsed.duration_seconds = duration
+        parsed.return_code = proc.returncode
+        return parsed
 
     duration = time.monotonic() - start_time
-    stdout_thread.join(timeout=10)
-    if stdout_thread.is_alive():
-        logger.warning("stdout 读取线程在 join 超时后仍在运行")
-    stderr_thread.join(timeout=10)
-    if stderr_thread.is_alive():
-        logger.warning("stderr 读取线程在 join 超时后仍在运行")
+    reader_thread.join(timeout=10)
+    if reader_thread.is_alive():
+        logger.warning("输出读取线程在 join 超时后仍在运行")
 
     stderr_text = "\n".join(stderr_lines)
     if proc.returncode != 0:
         logger.error("退出码 %d, stderr: %s", proc.returncode, stderr_text)
-        parsed = _parse_stream_json(stdout_lines)
+        parsed = stdout_parser.result()
         parsed.success = False
         parsed.error = f"退出码 {proc.returncode}: {stderr_text}"
         parsed.duration_seconds = duration
@@ -379,12 +602,45 @@ def _run_claude(
         return parsed
 
     # 解析 stream-json 输出
-    result = _parse_stream_json(stdout_lines)
+    result = stdout_parser.result()
     result.duration_seconds = duration
     result.return_code = proc.returncode
     return result
 
 
+# ── claude 命令行 ─────────────────────────────────────────────
+
+# 执行模式（允许直接改文件）与计划模式（只读）的固定参数
+_RUN_FLAGS = (
+    "--dangerously-skip-permissions",
+    "--output-format", "stream-json",
+    "--verbose",
+)
+_PLAN_FLAGS = ("--output-format", "stream-json", "--verbose")
+
+_PLAN_PROMPT_PREFIX = (
+    "请为以下任务生成详细的执行计划，列出所有需要修改的文件和具体步骤。"
+    "不要实际执行任何修改，只输出计划。\n\n"
+)
+_EXEC_PROMPT_TMPL = (
+    "请严格按照以下计划执行，不要偏离计划内容：\n\n"
+    "=== 执行计划 ===\n{plan}\n=== 计划结束 ===\n\n"
+    "现在开始执行上述计划。"
+)
+
+
+def _resolve_cwd(cwd: str | Path) -> Path:
+    """规范化工作目录；调用方已传入绝对 Path 时直接使用，省去逐级 stat."""
+    if isinstance(cwd, Path) and cwd.is_absolute():
+        return cwd
+    return Path(cwd).resolve()
+
+
+def _claude_cmd(prompt: str, flags: tuple[str, ...] = _RUN_FLAGS) -> list[str]:
+    """构造 claude CLI 命令列表."""
+    return ["claude", "-p", prompt, *flags]
+
+
 # ── 冲突解决 ─────────────────────────────────────────────────
 
 CONFLICT_RESOLUTION_PROMPT = """\
@@ -428,16 +684,10 @@ def resolve_conflicts(
     Returns:
         TaskResult，success=True 表示冲突已解决
     """
-    cwd = Path(cwd).resolve()
+    cwd = _resolve_cwd(cwd)
     logger.info("调用 Claude 解决 rebase 冲突, cwd=%s", cwd)
 
-    cmd = [
-        "claude",
-        "-p", CONFLICT_RESOLUTION_PROMPT,
-        "--dangerously-skip-permissions",
-        "--output-format", "stream-json",
-        "--verbose",
-    ]
+    cmd = _claude_cmd(CONFLICT_RESOLUTION_PROMPT)
 
     return _run_claude(
         cmd, cwd, timeout,
@@ -474,17 +724,11 @@ def run_task(
         docker_extra_args: 额外 docker run 参数
         on_output: 可选回调，每读到一行 stdout 时调用
     """
-    cwd = Path(cwd).resolve()
+    cwd = _resolve_cwd(cwd)
     logger.info("启动 Claude Code 任务，工作目录: %s", cwd)
     logger.debug("Prompt:\n%s", prompt)
 
-    cmd = [
-        "claude",
-        "-p", prompt,
-        "--dangerously-skip-permissions",
-        "--output-format", "stream-json",
-        "--verbose",
-    ]
+    cmd = _claude_cmd(prompt)
 
     result = _run_claude(
         cmd, cwd, timeout,
@@ -521,20 +765,10 @@ def generate_plan(
     Returns:
         TaskResult，output 为计划文本
     """
-    cwd = Path(cwd).resolve()
+    cwd = _resolve_cwd(cwd)
     logger.info("[Plan Mode] 第一步：生成执行计划, cwd=%s", cwd)
 
-    plan_prompt = (
-        "请为以下任务生成详细的执行计划，列出所有需要修改的文件和具体步骤。"
-        "不要实际执行任何修改，只输出计划。\n\n" + prompt
-    )
-
-    plan_cmd = [
-        "claude",
-        "-p", plan_prompt,
-        "--output-format", "stream-json",
-        "--verbose",
-    ]
+    plan_cmd = _claude_cmd(_PLAN_PROMPT_PREFIX + prompt, _PLAN_FLAGS)
 
     plan_timeout = min(timeout // 3, 300)
     result = _run_claude(
@@ -579,11 +813,7 @@ def execute_plan(
         on_output: 可选回调，每读到一行 stdout 时调用
     """
     logger.info("[Plan Mode] 第二步：按计划执行")
-    exec_prompt = (
-        "请严格按照以下计划执行，不要偏离计划内容：\n\n"
-        f"=== 执行计划 ===\n{plan_text}\n=== 计划结束 ===\n\n"
-        "现在开始执行上述计划。"
-    )
+    exec_prompt = _EXEC_PROMPT_TMPL.format(plan=plan_text)
 
     exec_result = run_task(
         exec_prompt, cwd=cwd, timeout=timeout,
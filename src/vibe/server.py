@@ -1,17 +1,16 @@
 """FastAPI Web 管理界面 — 任务查看、添加、重试 + SSE 实时日志."""
 
 import asyncio
-import itertools
+import json
 import logging
-import re
+import os
 import threading
-from collections import deque
 from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from .approval import ApprovalStore
@@ -19,7 +18,10 @@ from .config import Config, load_config
 from .history import ExecutionHistory
 from .loop import run_loop
 from .task import (
+    _NUM_PREFIX,
+    _TS_PREFIX,
     TaskQueue,
+    _list_md_names,
     _make_slug,
     extract_dependencies,
     extract_error_context,
@@ -31,26 +33,107 @@ from .worker import get_all_worker_status
 
 logger = logging.getLogger(__name__)
 
-# 全局日志缓冲（供 SSE 推送），存储 (seq, msg) 元组
-_log_seq = itertools.count()
-_log_buffer: deque[tuple[int, str]] = deque(maxlen=500)
+
+class _LogRing:
+    """定长环形日志缓冲：第 seq 条日志存放在 slots[seq % capacity].
+
+    存放编码好的 SSE 事件（写入时编码一次，各订阅者直接发送）；
+    按 seq 直接定位，订阅者只复制自己尚未读取的部分。
+    """
+
+    def __init__(self, capacity: int = 500) -> None:
+        self._capacity = capacity
+        self._slots: list[bytes] = [b""] * capacity
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, payload: bytes) -> None:
+        with self._lock:
+            self._slots[self._next_seq % self._capacity] = payload
+            self._next_seq += 1
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    def since(self, seq: int) -> tuple[int, list[bytes]]:
+        """返回 (下一个 seq, 从 seq 起的日志)；已被覆盖的旧日志从最早保留的一条开始."""
+        with self._lock:
+            end = self._next_seq
+            start = max(seq, end - self._capacity)
+            cap = self._capacity
+            return end, [self._slots[i % cap] for i in range(start, end)]
+
+
+# 全局日志缓冲（供 SSE 推送）
+_log_ring = _LogRing()
 _log_event: asyncio.Event | None = None
 _loop: asyncio.AbstractEventLoop | None = None
+# 已向事件循环提交、尚未执行的唤醒；一批日志只需唤醒一次（订阅者每次都会读完缓冲）
+_wake_pending = False
+_wake_lock = threading.Lock()
+_SSE_BATCH_DELAY = 0.05  # 秒
+
+
+def _wake_subscribers() -> None:
+    """在事件循环线程中执行：清除待唤醒标记并通知 SSE 订阅者."""
+    global _wake_pending
+    _wake_pending = False
+    event = _log_event
+    if event is not None:
+        event.set()
 
 
 class _SSELogHandler(logging.Handler):
     """将日志写入内存缓冲并通知 SSE 订阅者."""
 
     def emit(self, record: logging.LogRecord) -> None:
-        msg = self.format(record)
-        _log_buffer.append((next(_log_seq), msg))
+        global _wake_pending
+        payload = f"data: {self.format(record)}\n\n".encode("utf-8")
+        _log_ring.append(payload)
         loop = _loop
-        event = _log_event
-        if loop is not None and event is not None:
+        if loop is None or _log_event is None:
+            return
+        with _wake_lock:
+            if _wake_pending:
+                return
+            _wake_pending = True
             try:
-                loop.call_soon_threadsafe(event.set)
+                loop.call_soon_threadsafe(_wake_subscribers)
             except RuntimeError:
-                pass  # Event loop 已关闭（进程退出期间）
+                _wake_pending = False  # Event loop 已关闭（进程退出期间）
+
+
+async def _stream_log_events():
+    """SSE 日志流：先发送已有日志，之后每次唤醒等待片刻，把这段时间的日志合并成一个分块发送."""
+    cursor = 0
+    while True:
+        cursor, payloads = _log_ring.since(cursor)
+        if payloads:
+            yield b"".join(payloads)
+        event = _log_event
+        if event is None:
+            await asyncio.sleep(1)
+            continue
+        event.clear()
+        # 事件由所有订阅者共享：clear 之后再确认一次，避免漏掉 clear 之前写入的日志
+        if _log_ring.next_seq != cursor:
+            continue
+        try:
+            await asyncio.wait_for(event.wait(), timeout=15)
+        except asyncio.TimeoutError:
+            yield b": keepalive\n\n"
+            continue
+        # 合并突发日志，减少分块写入次数
+        await asyncio.sleep(_SSE_BATCH_DELAY)
+
+
+def _dir_mtime(directory: Path) -> int | None:
+    """目录 mtime（纳秒）；目录不存在时返回 None."""
+    try:
+        return os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        return None
 
 
 def _install_log_handler() -> None:
@@ -92,69 +175,93 @@ def create_app(
 
     # ── 任务列表 ─────────────────────────────────────────────
 
+    # 任务列表缓存：(目录快照键, 结果)；目录与待执行文件均未变化时直接复用
+    scan_cache: dict[str, tuple] = {}
+
     def _scan_tasks() -> list[dict]:
         """扫描文件系统，返回所有任务的状态（含描述、依赖信息）."""
         task_dir = workspace / config.task_dir
         done_dir = workspace / config.done_dir
         fail_dir = workspace / config.fail_dir
+
+        # 一次 scandir 分出 pending / running；pending 内容可能被编辑，带上 mtime 与大小
+        pending: list[tuple[str, int, int]] = []
+        running: list[str] = []
+        try:
+            with os.scandir(task_dir) as it:
+                for entry in it:
+                    name = entry.name
+                    if name.startswith("."):
+                        continue
+                    if name.endswith(".md") and ".running." not in name:
+                        try:
+                            st = entry.stat()
+                        except FileNotFoundError:
+                            continue  # 扫描期间被认领
+                        pending.append((name, st.st_mtime_ns, st.st_size))
+                    elif ".md.running." in name:
+                        running.append(name)
+        except FileNotFoundError:
+            pass
+        pending.sort()
+        running.sort()
+
+        key = (tuple(pending), tuple(running), _dir_mtime(done_dir), _dir_mtime(fail_dir))
+        cached = scan_cache.get("tasks")
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        done_names = _list_md_names(done_dir)
+        fail_names = _list_md_names(fail_dir)
         tasks = []
 
         # 预先收集 done 编号，用于判断依赖是否满足
         done_nums: set[int] = set()
-        if done_dir.is_dir():
-            for f in done_dir.glob("*.md"):
-                name = re.sub(r"^\d{8}_\d{6}(_\d{6})?_", "", f.stem)
-                m = re.match(r"^(\d+)", name)
-                if m:
-                    done_nums.add(int(m.group(1)))
-
-        failed_nums: set[int] = set()
-        if fail_dir.is_dir():
-            for f in fail_dir.glob("*.md"):
-                name = re.sub(r"^\d{8}_\d{6}(_\d{6})?_", "", f.stem)
-                m = re.match(r"^(\d+)", name)
-                if m:
-                    failed_nums.add(int(m.group(1)))
+        for fname in done_names:
+            m = _NUM_PREFIX.match(_TS_PREFIX.sub("", fname[:-3]))
+            if m:
+                done_nums.add(int(m.group(1)))
 
         # pending
-        for f in sorted(task_dir.glob("*.md")):
-            if ".running." not in f.name:
-                content = f.read_text(encoding="utf-8")
-                deps = extract_dependencies(content)
-                desc = first_content_line(content)
-                unmet = [d for d in deps if d not in done_nums] if deps else []
-                entry: dict = {
-                    "name": f.stem, "status": "pending", "file": f.name,
-                    "description": desc,
-                }
-                if deps:
-                    entry["depends"] = deps
-                    entry["blocked"] = bool(unmet)
-                    entry["unmet_deps"] = unmet
-                tasks.append(entry)
+        for fname, _, _ in pending:
+            try:
+                content = (task_dir / fname).read_text(encoding="utf-8")
+            except FileNotFoundError:
+                continue  # 扫描后被认领
+            deps = extract_dependencies(content)
+            desc = first_content_line(content)
+            unmet = [d for d in deps if d not in done_nums] if deps else []
+            entry: dict = {
+                "name": fname[:-3], "status": "pending", "file": fname,
+                "description": desc,
+            }
+            if deps:
+                entry["depends"] = deps
+                entry["blocked"] = bool(unmet)
+                entry["unmet_deps"] = unmet
+            tasks.append(entry)
 
         # running
-        for f in sorted(task_dir.glob("*.md.running.*")):
-            parts = f.name.split(".running.")
+        for fname in running:
+            parts = fname.split(".running.")
             worker = parts[1] if len(parts) > 1 else "?"
-            base_name = parts[0].replace(".md", "") if parts else f.stem
+            base_name = parts[0].replace(".md", "")
             tasks.append({
                 "name": base_name, "status": "running",
-                "worker": worker, "file": f.name,
+                "worker": worker, "file": fname,
             })
 
         # done
-        if done_dir.is_dir():
-            for f in sorted(done_dir.glob("*.md")):
-                name = re.sub(r"^\d{8}_\d{6}(_\d{6})?_", "", f.stem)
-                tasks.append({"name": name, "status": "done", "file": f.name})
+        for fname in done_names:
+            name = _TS_PREFIX.sub("", fname[:-3])
+            tasks.append({"name": name, "status": "done", "file": fname})
 
         # failed
-        if fail_dir.is_dir():
-            for f in sorted(fail_dir.glob("*.md")):
-                name = re.sub(r"^\d{8}_\d{6}(_\d{6})?_", "", f.stem)
-                tasks.append({"name": name, "status": "failed", "file": f.name})
+        for fname in fail_names:
+            name = _TS_PREFIX.sub("", fname[:-3])
+            tasks.append({"name": name, "status": "failed", "file": fname})
 
+        scan_cache["tasks"] = (key, tasks)
         return tasks
 
     @app.get("/api/tasks")
@@ -163,15 +270,8 @@ def create_app(
 
     # ── 添加任务 ─────────────────────────────────────────────
 
-    @app.post("/api/tasks")
-    async def add_task(request: Request) -> JSONResponse:
-        body = await request.json()
-        description = body.get("description", "").strip()
-        if not description:
-            return JSONResponse({"error": "description 不能为空"}, status_code=400)
-
-        depends: list[int] = body.get("depends", [])
-
+    def _create_task_file(description: str, depends: list[int]) -> tuple[int, str]:
+        """分配编号并写入新任务文件，返回 (编号, 文件名)."""
         task_dir = workspace / config.task_dir
         done_dir = workspace / config.done_dir
         fail_dir = workspace / config.fail_dir
@@ -189,6 +289,19 @@ def create_app(
             content += description + "\n"
 
             (task_dir / filename).write_text(content, encoding="utf-8")
+        return next_num, filename
+
+    @app.post("/api/tasks")
+    async def add_task(request: Request) -> JSONResponse:
+        body = await request.json()
+        description = body.get("description", "").strip()
+        if not description:
+            return JSONResponse({"error": "description 不能为空"}, status_code=400)
+
+        depends: list[int] = body.get("depends", [])
+
+        # 编号分配与写文件放到线程中执行，避免阻塞事件循环
+        next_num, filename = await asyncio.to_thread(_create_task_file, description, depends)
         logger.info("通过 Web 添加任务: %s", filename)
         return JSONResponse({"filename": filename, "number": next_num}, status_code=201)
 
@@ -233,7 +346,7 @@ def create_app(
         for search_dir in [task_dir, workspace / config.fail_dir]:
             matches = [
                 f for f in search_dir.glob("*.md")
-                if f.stem == name or re.sub(r"^\d{8}_\d{6}(_\d{6})?_", "", f.stem) == name
+                if f.stem == name or _TS_PREFIX.sub("", f.stem) == name
             ]
             if matches:
                 matches[0].unlink()
@@ -249,7 +362,6 @@ def create_app(
         task_dir = workspace / config.task_dir
         done_dir = workspace / config.done_dir
         fail_dir = workspace / config.fail_dir
-        _ts_re = re.compile(r"^\d{8}_\d{6}(_\d{6})?_")
 
         # 搜索所有目录
         search = [
@@ -264,7 +376,7 @@ def create_app(
             for f in search_dir.glob(pattern):
                 # 提取基本名称
                 fname = f.name.split(".running.")[0].replace(".md", "") if ".running." in f.name else f.stem
-                clean_name = _ts_re.sub("", fname)
+                clean_name = _TS_PREFIX.sub("", fname)
                 if fname == name or clean_name == name:
                     content = f.read_text(encoding="utf-8")
                     errors, diagnostics, clean_content = extract_error_context(content)
@@ -336,38 +448,25 @@ def create_app(
 
     # ── 配置 ─────────────────────────────────────────────────
 
+    # 配置响应缓存：(字段值快照, JSON 字节)；run_loop 启动时会改写 workspace，
+    # 因此按字段值比对而不是只计算一次
+    config_cache: dict[str, tuple] = {}
+
     @app.get("/api/config")
-    async def get_config() -> dict:
-        from dataclasses import asdict
-        return asdict(config)
+    async def get_config() -> Response:
+        fields = vars(config)
+        key = tuple(fields.values())
+        cached = config_cache.get("config")
+        if cached is None or cached[0] != key:
+            body = json.dumps(fields, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            cached = config_cache["config"] = (key, body)
+        return Response(content=cached[1], media_type="application/json")
 
     # ── SSE 实时日志 ──────────────────────────────────────────
 
     @app.get("/api/logs")
     async def stream_logs() -> StreamingResponse:
-        async def _generator():
-            last_seq = -1
-            # 先发送已有日志
-            for seq, msg in list(_log_buffer):
-                yield f"data: {msg}\n\n"
-                last_seq = seq
-            while True:
-                event = _log_event
-                if event is None:
-                    await asyncio.sleep(1)
-                    continue
-                event.clear()
-                try:
-                    await asyncio.wait_for(event.wait(), timeout=15)
-                except asyncio.TimeoutError:
-                    yield ": keepalive\n\n"
-                    continue
-                for seq, msg in list(_log_buffer):
-                    if seq > last_seq:
-                        yield f"data: {msg}\n\n"
-                        last_seq = seq
-
-        return StreamingResponse(_generator(), media_type="text/event-stream")
+        return StreamingResponse(_stream_log_events(), media_type="text/event-stream")
 
     # ── 审批端点 ───────────────────────────────────────────────
 
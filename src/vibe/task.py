@@ -16,8 +16,10 @@ logger = logging.getLogger(__name__)
 _RETRY_PATTERN = re.compile(r"<!--\s*RETRY:\s*(\d+)\s*-->")
 _DEPENDS_PATTERN = re.compile(r"<!--\s*DEPENDS:\s*([\d,\s]+)\s*-->")
 _ERROR_PATTERN = re.compile(r"<!--\s*Error:\s*(.*?)\s*-->")
-_TS_PREFIX = re.compile(r"^\d{8}_\d{6}(_\d{6})?_")
+_TS_PREFIX = re.compile(r"^\d{8}_\d{6}(?:_\d{6})?_")
 _NUM_PREFIX = re.compile(r"^(\d+)")
+_SLUG_INVALID = re.compile(r"[^\w]")
+_SLUG_UNDERSCORES = re.compile(r"_+")
 _COMMENT_PREFIXES = (
     "<!-- RETRY:",
     "<!-- DEPENDS:",
@@ -29,6 +31,22 @@ _COMMENT_PREFIXES = (
 )
 
 
+def _list_md_names(directory: str | Path) -> list[str]:
+    """返回目录下 *.md 文件名（已排序，跳过隐藏文件与子目录）；目录不存在时返回空列表.
+
+    用 os.scandir 只比较文件名，不为不匹配的条目（如 .running.*）构造 Path；
+    is_file() 使用目录项自带的类型信息，通常无需额外 stat。
+    """
+    try:
+        with os.scandir(directory) as it:
+            return sorted(
+                e.name for e in it
+                if e.name.endswith(".md") and not e.name.startswith(".") and e.is_file()
+            )
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
 @dataclass
 class Task:
     """单个任务."""
@@ -47,13 +65,30 @@ class TaskQueue:
     threading.Lock 保护扫描 + 重命名的原子性。
     """
 
-    def __init__(self, config: Config, workspace: Path) -> None:
+    def __init__(
+        self,
+        config: Config,
+        workspace: Path,
+        initial_pending: list[Path] | None = None,
+    ) -> None:
+        """初始化队列并确保 done/failed 目录存在.
+
+        Args:
+            initial_pending: 调用方已扫描得到的 pending 任务列表，首次 claim_next
+                直接使用，避免重复扫描目录；之后的认领仍实时扫描。
+        """
         self._lock = threading.Lock()
+        self._initial_pending = (
+            sorted(p.name for p in initial_pending) if initial_pending is not None else None
+        )
         self._config = config
         self._workspace = workspace
         self._task_dir = workspace / config.task_dir
         self._done_dir = workspace / config.done_dir
         self._fail_dir = workspace / config.fail_dir
+        # 热路径（认领/归档/释放）直接用字符串调用 os.*，省去 Path 构造与 str() 转换
+        self._task_dir_str = os.fspath(self._task_dir)
+        self._done_dir_str = os.fspath(self._done_dir)
         # 确保目录存在
         self._done_dir.mkdir(parents=True, exist_ok=True)
         self._fail_dir.mkdir(parents=True, exist_ok=True)
@@ -64,56 +99,62 @@ class TaskQueue:
         依赖感知: 检查每个 pending 任务的 DEPENDS 注释，仅认领依赖全部完成的任务。
         """
         with self._lock:
-            pending = sorted(self._task_dir.glob("*.md"))
+            if self._initial_pending is not None:
+                pending, self._initial_pending = self._initial_pending, None
+            else:
+                pending = _list_md_names(self._task_dir_str)
             if not pending:
                 return None
 
             done_nums = self._get_done_numbers()
 
-            task_file: Path | None = None
+            task_name: str | None = None
             content: str = ""
-            for candidate in pending:
+            for candidate_name in pending:
+                candidate = os.path.join(self._task_dir_str, candidate_name)
                 try:
-                    file_size = candidate.stat().st_size
+                    file_size = os.stat(candidate).st_size
                 except OSError:
                     continue
                 if file_size > _MAX_TASK_FILE_SIZE:
                     logger.error(
                         "任务文件 %s 过大 (%d bytes > %d)，跳过",
-                        candidate.name, file_size, _MAX_TASK_FILE_SIZE,
+                        candidate_name, file_size, _MAX_TASK_FILE_SIZE,
                     )
                     continue
-                raw = candidate.read_text(encoding="utf-8")
+                with open(candidate, encoding="utf-8") as f:
+                    raw = f.read()
                 deps = extract_dependencies(raw)
                 if deps:
                     unmet = [d for d in deps if d not in done_nums]
                     if unmet:
                         logger.debug(
-                            "任务 %s 依赖未满足 %s，跳过", candidate.name, unmet,
+                            "任务 %s 依赖未满足 %s，跳过", candidate_name, unmet,
                         )
                         continue
-                task_file = candidate
+                task_name = candidate_name
                 content = raw
                 break
 
-            if task_file is None:
+            if task_name is None:
                 return None
 
-            running_name = f"{task_file.name}.running.{worker_id}"
-            running_path = self._task_dir / running_name
-
+            running_name = f"{task_name}.running.{worker_id}"
             try:
-                task_file.rename(running_path)
+                os.rename(
+                    os.path.join(self._task_dir_str, task_name),
+                    os.path.join(self._task_dir_str, running_name),
+                )
             except OSError as e:
-                logger.warning("认领任务 %s 失败: %s", task_file.name, e)
+                logger.warning("认领任务 %s 失败: %s", task_name, e)
                 return None
 
         retries = extract_retry_count(content)
         deps = extract_dependencies(content)
 
         return Task(
-            path=running_path,
-            name=task_file.stem,
+            path=self._task_dir / running_name,
+            name=task_name[:-3],
             content=content,
             retries=retries,
             depends_on=deps if deps else None,
@@ -146,9 +187,8 @@ class TaskQueue:
     def release(self, task: Task) -> None:
         """释放任务回队列: 将 .running.{worker_id} 重命名回 .md."""
         original_name = task.path.name.split(".running.")[0]
-        dest = self._task_dir / original_name
         try:
-            task.path.rename(dest)
+            os.rename(task.path, os.path.join(self._task_dir_str, original_name))
             logger.info("任务已释放回队列: %s → %s", task.path.name, original_name)
         except OSError as e:
             logger.error("释放任务 %s 失败: %s", task.name, e)
@@ -156,10 +196,10 @@ class TaskQueue:
     def complete(self, task: Task) -> None:
         """将完成的任务移到 done/ 目录（带时间戳）."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        dest = self._done_dir / f"{timestamp}_{task.name}.md"
+        dest_name = f"{timestamp}_{task.name}.md"
         try:
-            task.path.rename(dest)
-            logger.info("任务已归档: %s → %s", task.name, dest.name)
+            os.rename(task.path, os.path.join(self._done_dir_str, dest_name))
+            logger.info("任务已归档: %s → %s", task.name, dest_name)
         except OSError as e:
             logger.error("归档任务 %s 失败: %s", task.name, e)
 
@@ -240,6 +280,16 @@ class TaskQueue:
 
         retried: list[str] = []
         for src in matches:
+            try:
+                file_size = src.stat().st_size
+            except OSError:
+                continue
+            if file_size > _MAX_TASK_FILE_SIZE:
+                logger.error(
+                    "失败任务文件 %s 过大 (%d bytes > %d)，跳过重试",
+                    src.name, file_size, _MAX_TASK_FILE_SIZE,
+                )
+                continue
             content = src.read_text(encoding="utf-8")
             _, _, clean_content = extract_error_context(content)
 
@@ -286,11 +336,11 @@ _MAX_TASK_FILE_SIZE = 1024 * 1024  # 1 MB
 
 def _atomic_write(dest: Path, content: str) -> None:
     """原子写入文件: 先写到临时文件，再 os.replace() 到目标路径."""
-    fd, tmp_path = tempfile.mkstemp(dir=str(dest.parent), suffix=".tmp")
+    fd, tmp_path = tempfile.mkstemp(dir=dest.parent, suffix=".tmp")
     try:
         with os.fdopen(fd, "w", encoding="utf-8") as f:
             f.write(content)
-        os.replace(tmp_path, str(dest))
+        os.replace(tmp_path, dest)
     except BaseException:
         try:
             os.unlink(tmp_path)
@@ -344,7 +394,7 @@ def extract_error_context(content: str) -> tuple[list[str], list[str], str]:
                 diag_lines.append(rest)
             continue
 
-        if any(stripped.startswith(p) for p in _COMMENT_PREFIXES):
+        if stripped.startswith(_COMMENT_PREFIXES):
             m = _ERROR_PATTERN.search(stripped)
             if m:
                 errors.append(m.group(1))
@@ -401,36 +451,23 @@ def next_task_number(
     """扫描所有任务来源，返回下一个可用编号.
 
     扫描 4 个来源: pending (*.md), running (*.md.running.*), done/, failed/。
+    每个目录只做一次 os.scandir，仅读目录项名称（不 stat），目录不存在时跳过。
     """
     max_num = 0
-
-    def _extract_num(name: str) -> int:
-        """从文件名（stem 或去时间戳后）中提取编号前缀."""
-        m = _NUM_PREFIX.match(name)
-        return int(m.group(1)) if m else 0
-
-    # pending
-    for f in task_dir.glob("*.md"):
-        if ".running." not in f.name:
-            max_num = max(max_num, _extract_num(f.stem))
-
-    # running
-    for f in task_dir.glob("*.md.running.*"):
-        base = f.name.split(".running.")[0].replace(".md", "")
-        max_num = max(max_num, _extract_num(base))
-
-    # done
-    if done_dir.is_dir():
-        for f in done_dir.glob("*.md"):
-            name = _TS_PREFIX.sub("", f.stem)
-            max_num = max(max_num, _extract_num(name))
-
-    # failed
-    if fail_dir.is_dir():
-        for f in fail_dir.glob("*.md"):
-            name = _TS_PREFIX.sub("", f.stem)
-            max_num = max(max_num, _extract_num(name))
-
+    for directory, strip_ts in ((task_dir, False), (done_dir, True), (fail_dir, True)):
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    name = entry.name
+                    if not (name.endswith(".md") or ".md.running." in name):
+                        continue
+                    if strip_ts:
+                        name = _TS_PREFIX.sub("", name)
+                    m = _NUM_PREFIX.match(name)
+                    if m:
+                        max_num = max(max_num, int(m.group(1)))
+        except FileNotFoundError:
+            pass
     return max_num + 1
 
 
@@ -441,16 +478,19 @@ def _make_slug(description: str, max_len: int = 60) -> str:
     """
     first_line = description.split("\n", 1)[0].strip()
     # 允许 Unicode 字母/数字/下划线，替换其余字符
-    slug = re.sub(r"[^\w]", "_", first_line, flags=re.UNICODE)
+    slug = _SLUG_INVALID.sub("_", first_line)
     # 合并连续下划线，去除首尾下划线
-    slug = re.sub(r"_+", "_", slug).strip("_")
+    slug = _SLUG_UNDERSCORES.sub("_", slug).strip("_")
     return slug[:max_len]
 
 
 def _set_retry_count(content: str, count: int) -> str:
     """设置或更新任务内容中的重试次数标记."""
     marker = f"<!-- RETRY: {count} -->"
-    if _RETRY_PATTERN.search(content):
-        return _RETRY_PATTERN.sub(marker, content)
-    # 添加到内容开头
-    return marker + "\n" + content
+    match = _RETRY_PATTERN.search(content)
+    if match is None:
+        # 添加到内容开头
+        return marker + "\n" + content
+    # 复用 search 的位置直接拼接，只对剩余部分继续替换（可能存在多个标记）
+    rest = content[match.end():]
+    return content[:match.start()] + marker + _RETRY_PATTERN.sub(marker, rest)
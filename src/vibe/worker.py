@@ -11,7 +11,7 @@ from pathlib import Path
 
 from . import manager
 from .analyzer import analyze_execution
-from .approval import ApprovalStore
+from .approval import ApprovalDecision, ApprovalStore
 from .config import Config
 from .history import ExecutionHistory
 from .manager import TaskResult
@@ -65,29 +65,29 @@ def build_prompt(task: Task | str, dep_context: str = "") -> str:
     接受 Task 对象或纯字符串（向后兼容）。
     dep_context: 可选的前置任务执行结果，注入到 prompt 中。
     """
+    # 各段收集到列表后一次 join，避免 += 逐段复制越来越长的 prompt
     if isinstance(task, str):
-        return PROMPT_PREFIX + task + PROMPT_SUFFIX
+        return "".join((PROMPT_PREFIX, task, PROMPT_SUFFIX))
 
     if task.retries > 0:
         errors, diagnostics, clean_content = extract_error_context(task.content)
         if errors or diagnostics:
-            sections = PROMPT_PREFIX + clean_content
+            parts = [PROMPT_PREFIX, clean_content]
             if dep_context:
-                sections += "\n\n" + dep_context
-            sections += "\n\n## 上次执行失败信息\n\n"
-            sections += f"这是第 {task.retries + 1} 次尝试。"
+                parts += ("\n\n", dep_context)
+            parts += ("\n\n## 上次执行失败信息\n\n", f"这是第 {task.retries + 1} 次尝试。")
             if errors:
-                error_block = "\n".join(f"- {e}" for e in errors)
-                sections += f"之前失败的原因：\n{error_block}\n"
+                parts.append("之前失败的原因：\n")
+                parts.append("\n".join(f"- {e}" for e in errors))
+                parts.append("\n")
             if diagnostics:
-                sections += f"\n### 执行诊断\n\n{diagnostics[-1]}\n"
-            sections += "请特别注意避免同样的错误。\n"
-            return sections + PROMPT_SUFFIX
+                parts += ("\n### 执行诊断\n\n", diagnostics[-1], "\n")
+            parts += ("请特别注意避免同样的错误。\n", PROMPT_SUFFIX)
+            return "".join(parts)
 
-    body = PROMPT_PREFIX + task.content
     if dep_context:
-        body += "\n\n" + dep_context
-    return body + PROMPT_SUFFIX
+        return "".join((PROMPT_PREFIX, task.content, "\n\n", dep_context, PROMPT_SUFFIX))
+    return "".join((PROMPT_PREFIX, task.content, PROMPT_SUFFIX))
 
 logger = logging.getLogger(__name__)
 
@@ -151,7 +151,10 @@ def _make_verbose_callback(worker_id: str) -> Callable[[str], None]:
 
     def _on_output(line: str) -> None:
         line = line.strip()
-        if not line:
+        # 只关心 assistant / result 事件：先做子串筛选，其余行不做 JSON 解析
+        if not line.startswith("{") or not (
+            '"assistant"' in line or '"result"' in line
+        ):
             return
         try:
             event = json.loads(line)
@@ -359,15 +362,13 @@ def _execute_with_approval(
     docker_extra_args: str = "",
 ) -> TaskResult:
     """Plan 模式 + 人工审批: 生成计划 → 等待审批 → 执行."""
-    import time
-
     docker_kw = {
         "use_docker": use_docker,
         "docker_image": docker_image,
         "docker_extra_args": docker_extra_args,
     }
 
-    start_time = time.monotonic()
+    start_time = _time.monotonic()
 
     # Step 1: 生成计划
     plan_result = manager.generate_plan(
@@ -384,7 +385,7 @@ def _execute_with_approval(
     logger.info("[%s] 计划已生成，等待人工审批: %s", worker_id, task_name)
     approval = approval_store.submit(task_name, worker_id, plan_text)
 
-    remaining_timeout = timeout - int(time.monotonic() - start_time)
+    remaining_timeout = timeout - int(_time.monotonic() - start_time)
     if remaining_timeout < 60:
         remaining_timeout = 60
 
@@ -397,12 +398,14 @@ def _execute_with_approval(
         logger.warning("[%s] 审批等待超时: %s", worker_id, task_name)
         return TaskResult(success=False, error="审批等待超时")
 
-    from .approval import ApprovalDecision
-
     if approval.decision == ApprovalDecision.REJECTED:
         logger.info("[%s] 计划被拒绝: %s", worker_id, task_name)
         return TaskResult(success=False, error="用户拒绝计划")
 
+    if approval.decision == ApprovalDecision.CANCELLED:
+        logger.info("[%s] 审批已取消: %s", worker_id, task_name)
+        return TaskResult(success=False, error="审批已取消")
+
     # Step 3: 注入用户反馈到 plan_text
     if approval.feedback or approval.selections:
         feedback_section = "\n\n## 用户反馈\n"
@@ -417,7 +420,7 @@ def _execute_with_approval(
     # Step 4: 执行计划
     update_worker_status(worker_id, phase="executing")
     logger.info("[%s] 计划已批准，开始执行: %s", worker_id, task_name)
-    remaining_timeout = timeout - int(time.monotonic() - start_time)
+    remaining_timeout = timeout - int(_time.monotonic() - start_time)
     if remaining_timeout < 60:
         remaining_timeout = 60
 
@@ -425,5 +428,5 @@ def _execute_with_approval(
         plan_text, cwd=cwd, timeout=remaining_timeout,
         shutdown_event=shutdown_event, on_output=on_output, **docker_kw,
     )
-    exec_result.duration_seconds = time.monotonic() - start_time
+    exec_result.duration_seconds = _time.monotonic() - start_time
     return exec_result
@@ -17,6 +17,7 @@ def _run_git(args: list[str], cwd: Path) -> subprocess.CompletedProcess[str]:
     return subprocess.run(
         ["git", *args],
         cwd=str(cwd),
+        stdin=subprocess.DEVNULL,  # 不继承终端 stdin，避免 git 等待凭据/编辑器输入
         capture_output=True,
         text=True,
         timeout=60,
@@ -16,6 +16,16 @@ def workspace(tmp_path: Path) -> Path:
     return tmp_path
 
 
+@pytest.fixture
+def make_task(workspace: Path):
+    """返回在 tasks/ 下写入任务文件的工厂函数: make_task(name, body) -> Path."""
+    def _make(name: str = "001_test.md", body: str = "task") -> Path:
+        path = workspace / "tasks" / name
+        path.write_text(body, encoding="utf-8")
+        return path
+    return _make
+
+
 @pytest.fixture
 def config(workspace: Path) -> Config:
     """返回指向 tmp workspace 的 Config."""
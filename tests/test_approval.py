@@ -2,7 +2,7 @@
 
 import threading
 
-from vibe.approval import ApprovalDecision, ApprovalStore, PendingApproval
+from vibe.approval import ApprovalDecision, ApprovalStore
 
 
 class TestPendingApproval:
@@ -57,6 +57,23 @@ class TestApprovalStore:
         pending = store.list_pending()
         assert len(pending) == 0
 
+    def test_list_pending_excludes_decided(self):
+        store = ApprovalStore()
+        a = store.submit("task1", "w0", "plan A")
+        b = store.submit("task2", "w1", "plan B")
+        c = store.submit("task3", "w2", "plan C")
+        store.approve(a.approval_id)
+        store.reject(b.approval_id)
+        assert [item.approval_id for item in store.list_pending()] == [c.approval_id]
+        # 已决策的项仍可通过 get 查询
+        assert store.get(a.approval_id) is a
+
+    def test_list_pending_after_direct_item_decision(self):
+        store = ApprovalStore()
+        item = store.submit("task1", "w0", "plan A")
+        item.approve()
+        assert store.list_pending() == []
+
     def test_reject(self):
         store = ApprovalStore()
         item = store.submit("task1", "w0", "plan A")
@@ -77,6 +94,23 @@ class TestApprovalStore:
         store.remove(item.approval_id)
         assert store.get(item.approval_id) is None
 
+    def test_remove_pending_cancels_and_wakes_waiter(self):
+        store = ApprovalStore()
+        item = store.submit("task1", "w0", "plan A")
+        t = threading.Thread(target=item.wait, kwargs={"timeout": 10})
+        t.start()
+        store.remove(item.approval_id)
+        t.join(timeout=2)
+        assert not t.is_alive()
+        assert item.decision == ApprovalDecision.CANCELLED
+
+    def test_remove_decided_keeps_decision(self):
+        store = ApprovalStore()
+        item = store.submit("task1", "w0", "plan A")
+        store.approve(item.approval_id)
+        store.remove(item.approval_id)
+        assert item.decision == ApprovalDecision.APPROVED
+
     def test_get(self):
         store = ApprovalStore()
         item = store.submit("task1", "w0", "plan A")
@@ -1,11 +1,19 @@
 """测试 config.py — 纯函数 + 环境变量."""
 
+import os
 from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 
-from vibe.config import Config, _coerce, _parse_dotenv, load_config, log_active_config
+from vibe.config import (
+    _FIELD_TABLE,
+    Config,
+    _coerce,
+    _parse_dotenv,
+    load_config,
+    log_active_config,
+)
 
 
 # ── _parse_dotenv ────────────────────────────────────────────
@@ -34,6 +42,30 @@ class TestParseDotenv:
     def test_missing_file(self, tmp_path: Path):
         assert _parse_dotenv(tmp_path / "nonexistent") == {}
 
+    def test_inline_comment(self, tmp_path: Path):
+        env_file = tmp_path / ".env"
+        env_file.write_text(
+            "VIBE_A=4  # workers\nVIBE_B=a#b\nVIBE_C=\"x y\" # note\n",
+            encoding="utf-8",
+        )
+        result = _parse_dotenv(env_file)
+        assert result == {"VIBE_A": "4", "VIBE_B": "a#b", "VIBE_C": "x y"}
+
+    def test_cached_until_modified(self, tmp_path: Path):
+        env_file = tmp_path / ".env"
+        env_file.write_text("VIBE_A=1\n", encoding="utf-8")
+        first = _parse_dotenv(env_file)
+        first["VIBE_A"] = "mutated"
+        with patch.object(Path, "read_text", side_effect=AssertionError("re-read")):
+            assert _parse_dotenv(env_file) == {"VIBE_A": "1"}
+        env_file.write_text("VIBE_A=22\n", encoding="utf-8")
+        assert _parse_dotenv(env_file) == {"VIBE_A": "22"}
+
+    def test_crlf_and_spaces(self, tmp_path: Path):
+        env_file = tmp_path / ".env"
+        env_file.write_bytes(b"  VIBE_A = 1 \r\nVIBE_B=\r\nnot a pair\r\n")
+        assert _parse_dotenv(env_file) == {"VIBE_A": "1", "VIBE_B": ""}
+
 
 # ── _coerce ──────────────────────────────────────────────────
 
@@ -52,6 +84,15 @@ class TestCoerce:
     def test_str(self):
         assert _coerce("hello", str) == "hello"
 
+    def test_invalid_int(self):
+        assert _coerce("abc", int, "timeout") is None
+
+    def test_field_table_uses_real_types(self):
+        types = {name: ftype for _, _, name, ftype in _FIELD_TABLE}
+        assert types["timeout"] is int
+        assert types["use_docker"] is bool
+        assert types["task_dir"] is str
+
 
 # ── load_config ──────────────────────────────────────────────
 
@@ -146,6 +187,45 @@ class TestLoadConfig:
         assert cfg.verbose is True
 
 
+class TestLoadConfigCache:
+    def test_returns_independent_copies(self, tmp_path: Path):
+        """缓存命中时返回独立副本，修改不影响后续调用."""
+        with patch("vibe.config.Path.cwd", return_value=tmp_path):
+            first = load_config(workspace=tmp_path)
+            first.max_workers = 99
+            second = load_config(workspace=tmp_path)
+        assert second is not first
+        assert second.max_workers == 1
+
+    def test_no_overrides_skips_coercion(self, tmp_path: Path, monkeypatch):
+        """无 .env 且无 VIBE_ 环境变量时直接返回默认值."""
+        for key in [k for k in os.environ if k.startswith("VIBE_")]:
+            monkeypatch.delenv(key)
+        with (
+            patch("vibe.config.Path.cwd", return_value=tmp_path),
+            patch("vibe.config._coerce") as mock_coerce,
+        ):
+            cfg = load_config(workspace=tmp_path)
+        mock_coerce.assert_not_called()
+        assert cfg == Config()
+
+    def test_dotenv_change_invalidates(self, tmp_path: Path):
+        """.env 变更后重新解析."""
+        env_file = tmp_path / ".env"
+        env_file.write_text("VIBE_MAX_WORKERS=2\n", encoding="utf-8")
+        with patch("vibe.config.Path.cwd", return_value=tmp_path):
+            assert load_config(workspace=tmp_path).max_workers == 2
+            env_file.write_text("VIBE_MAX_WORKERS=12\n", encoding="utf-8")
+            assert load_config(workspace=tmp_path).max_workers == 12
+
+    def test_env_change_invalidates(self, tmp_path: Path, monkeypatch):
+        """VIBE_ 环境变量变化后重新计算."""
+        with patch("vibe.config.Path.cwd", return_value=tmp_path):
+            assert load_config(workspace=tmp_path).timeout == 600
+            monkeypatch.setenv("VIBE_TIMEOUT", "42")
+            assert load_config(workspace=tmp_path).timeout == 42
+
+
 # ── 双路径 .env 加载 ────────────────────────────────────────
 
 class TestDualDotenv:
@@ -1,8 +1,9 @@
 """测试 loop.py — mock worker + worktree 函数."""
 
 import threading
+from collections.abc import Callable
 from pathlib import Path
-from unittest.mock import MagicMock, patch, call
+from unittest.mock import DEFAULT, patch
 
 import pytest
 
@@ -11,16 +12,51 @@ from vibe.loop import run_loop
 from vibe.worker import shutdown_event
 
 
+def _fake_create_worktree(workspace: Path, worker_id: str) -> Path:
+    """按 worker 编号返回固定路径（worktree 并行创建，调用顺序不确定）."""
+    return Path(f"/tmp/wt{worker_id[1:]}")
+
+
+@pytest.fixture
+def wt_mocks():
+    """mock 掉 worktree 模式下 vibe.loop 的全部 git/worker 依赖，返回 {名称: mock}."""
+    with patch.multiple(
+        "vibe.loop",
+        is_git_repo=DEFAULT,
+        cleanup_stale_worktrees=DEFAULT,
+        create_worktree=DEFAULT,
+        worker_loop=DEFAULT,
+        MergeCoordinator=DEFAULT,
+        remove_worktree=DEFAULT,
+    ) as mocks:
+        mocks["is_git_repo"].return_value = True
+        mocks["create_worktree"].side_effect = _fake_create_worktree
+        yield mocks
+
+
 class TestRunLoop:
+    def setup_method(self):
+        shutdown_event.clear()
+
+    def teardown_method(self):
+        shutdown_event.clear()
+
     def test_no_tasks(self, config: Config, workspace: Path):
         """无 .md 文件 → 不启动 worker."""
         with patch("vibe.loop.worker_loop") as mock_wl:
             run_loop(config)
         mock_wl.assert_not_called()
 
-    def test_single_worker(self, config: Config, workspace: Path):
+    def test_hidden_md_not_a_batch(self, config: Config, workspace: Path):
+        """隐藏 .md 文件不计入待执行任务."""
+        (workspace / "tasks" / ".draft.md").write_text("task", encoding="utf-8")
+        with patch("vibe.loop.worker_loop") as mock_wl:
+            run_loop(config)
+        mock_wl.assert_not_called()
+
+    def test_single_worker(self, config: Config, workspace: Path, make_task):
         """max_workers=1 → 直接调用 worker_loop."""
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         with patch("vibe.loop.worker_loop") as mock_wl:
             run_loop(config)
@@ -28,10 +64,10 @@ class TestRunLoop:
         args = mock_wl.call_args[0]
         assert args[0] == "w0"  # worker_id
 
-    def test_multi_worker_no_git(self, workspace: Path):
+    def test_multi_worker_no_git(self, workspace: Path, make_task):
         """多 worker + 非 git → 走共享模式."""
         cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         with (
             patch("vibe.loop.is_git_repo", return_value=False),
@@ -41,117 +77,159 @@ class TestRunLoop:
         # 应该被调用两次（2 个 worker）
         assert mock_wl.call_count == 2
 
-    def test_multi_worker_with_worktree(self, workspace: Path):
-        """多 worker + git → 创建 worktree + on_task_success/on_before_task 回调 + 无条件清理."""
+    def test_git_probe_once_per_batch(self, workspace: Path, make_task):
+        """非 git 降级路径只探测一次 is_git_repo."""
         cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         with (
-            patch("vibe.loop.is_git_repo", return_value=True),
-            patch("vibe.loop.cleanup_stale_worktrees"),
-            patch("vibe.loop.create_worktree", side_effect=[Path("/tmp/wt0"), Path("/tmp/wt1")]) as mock_create,
-            patch("vibe.loop.worker_loop") as mock_wl,
-            patch("vibe.loop.MergeCoordinator"),
-            patch("vibe.loop.remove_worktree") as mock_remove,
+            patch("vibe.loop.is_git_repo", return_value=False) as mock_git,
+            patch("vibe.loop.worker_loop"),
         ):
             run_loop(cfg)
+        mock_git.assert_called_once()
 
-        assert mock_create.call_count == 2
+    def test_multi_worker_with_worktree(self, workspace: Path, wt_mocks: dict, make_task):
+        """多 worker + git → 创建 worktree + on_task_success/on_before_task 回调 + 无条件清理."""
+        cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
+        make_task()
+
+        run_loop(cfg)
+
+        assert wt_mocks["create_worktree"].call_count == 2
+        mock_wl = wt_mocks["worker_loop"]
         assert mock_wl.call_count == 2
         # 验证 on_task_success 和 on_before_task 回调已传递给 worker_loop
         for c in mock_wl.call_args_list:
             assert c.kwargs.get("on_task_success") is not None
             assert c.kwargs.get("on_before_task") is not None
         # worktrees 无条件被清理
-        assert mock_remove.call_count == 2
+        assert wt_mocks["remove_worktree"].call_count == 2
 
-    def test_no_batch_merge_at_end(self, workspace: Path):
+    def test_no_batch_merge_at_end(self, workspace: Path, wt_mocks: dict, make_task):
         """验证不再调用旧的 commit_and_merge."""
         cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
-        with (
-            patch("vibe.loop.is_git_repo", return_value=True),
-            patch("vibe.loop.cleanup_stale_worktrees"),
-            patch("vibe.loop.create_worktree", side_effect=[Path("/tmp/wt0"), Path("/tmp/wt1")]),
-            patch("vibe.loop.worker_loop"),
-            patch("vibe.loop.MergeCoordinator"),
-            patch("vibe.loop.remove_worktree"),
-        ):
-            # commit_and_merge 不再被导入/使用，如果代码中仍然引用它会报错
-            run_loop(cfg)
+        # commit_and_merge 不再被导入/使用，如果代码中仍然引用它会报错
+        run_loop(cfg)
+
+    def test_worktree_removed_when_its_worker_exits(self, workspace: Path, wt_mocks: dict, make_task):
+        """worker 退出即移除自己的 worktree，不等待其他 worker."""
+        cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
+        make_task()
+        wt0_removed = threading.Event()
+
+        def worker(worker_id, *args, **kwargs):
+            if worker_id == "w1":
+                # w1 仍在运行时，w0 的 worktree 应已被清理
+                assert wt0_removed.wait(timeout=5)
+
+        def remove(ws, wt_path):
+            if wt_path == Path("/tmp/wt0"):
+                wt0_removed.set()
 
-    def test_worktree_always_removed(self, workspace: Path):
+        wt_mocks["worker_loop"].side_effect = worker
+        wt_mocks["remove_worktree"].side_effect = remove
+        run_loop(cfg)
+
+        assert wt_mocks["remove_worktree"].call_count == 2
+
+    def test_worktree_always_removed(self, workspace: Path, wt_mocks: dict, make_task):
         """即使 worker 抛异常，worktrees 也应被清理."""
         cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         def raise_in_worker(*args, **kwargs):
             raise RuntimeError("worker crashed")
 
+        wt_mocks["worker_loop"].side_effect = raise_in_worker
+        try:
+            run_loop(cfg)
+        except RuntimeError:
+            pass
+
+        # Both worktrees should be cleaned up even after crash
+        assert wt_mocks["remove_worktree"].call_count == 2
+
+    def test_worker_crash_stops_other_workers(self, workspace: Path, make_task):
+        """一个 worker 抛异常 → 立即通知其余 worker 停止，异常向上传播."""
+        cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
+        make_task()
+        survivor_started = threading.Event()
+        survivor_stopped = threading.Event()
+
+        def worker(worker_id, *args, **kwargs):
+            if worker_id == "w0":
+                survivor_started.wait(timeout=5)
+                raise RuntimeError("worker crashed")
+            survivor_started.set()
+            # 模拟长时间运行的 worker，直到收到关闭信号
+            if shutdown_event.wait(timeout=5):
+                survivor_stopped.set()
+
         with (
-            patch("vibe.loop.is_git_repo", return_value=True),
-            patch("vibe.loop.cleanup_stale_worktrees"),
-            patch("vibe.loop.create_worktree", side_effect=[Path("/tmp/wt0"), Path("/tmp/wt1")]),
-            patch("vibe.loop.worker_loop", side_effect=raise_in_worker),
-            patch("vibe.loop.MergeCoordinator"),
-            patch("vibe.loop.remove_worktree") as mock_remove,
+            patch("vibe.loop.is_git_repo", return_value=False),
+            patch("vibe.loop.worker_loop", side_effect=worker),
+            pytest.raises(RuntimeError, match="worker crashed"),
         ):
-            try:
-                run_loop(cfg)
-            except RuntimeError:
-                pass
+            run_loop(cfg)
 
-        # Both worktrees should be cleaned up even after crash
-        assert mock_remove.call_count == 2
+        assert survivor_stopped.is_set()
 
-    def test_worktree_creation_failure_fallback(self, workspace: Path):
+    def test_worktree_creation_failure_fallback(self, workspace: Path, wt_mocks: dict, make_task):
         """创建失败 → 清理 + 降级共享模式."""
         cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         def create_side_effect(workspace, wid):
             if wid == "w1":
                 raise RuntimeError("fail")
             return Path("/tmp/wt0")
 
-        with (
-            patch("vibe.loop.is_git_repo", return_value=True),
-            patch("vibe.loop.cleanup_stale_worktrees"),
-            patch("vibe.loop.create_worktree", side_effect=create_side_effect),
-            patch("vibe.loop.worker_loop") as mock_wl,
-            patch("vibe.loop.remove_worktree") as mock_remove,
-        ):
-            run_loop(cfg)
+        wt_mocks["create_worktree"].side_effect = create_side_effect
+        run_loop(cfg)
 
         # 应该已清理第一个 worktree 并降级到共享模式
-        mock_remove.assert_called_once()
+        wt_mocks["remove_worktree"].assert_called_once()
+        wt_mocks["MergeCoordinator"].assert_not_called()
         # 共享模式仍然运行 worker
-        assert mock_wl.call_count == 2
+        assert wt_mocks["worker_loop"].call_count == 2
+
+    def test_worktrees_created_concurrently(self, workspace: Path, wt_mocks: dict, make_task):
+        """各 worker 的 worktree 并行创建."""
+        cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
+        make_task()
+        barrier = threading.Barrier(2, timeout=5)
+
+        def create_side_effect(workspace, wid):
+            barrier.wait()  # 串行创建时第一个调用会在此超时
+            return Path(f"/tmp/wt-{wid}")
+
+        wt_mocks["create_worktree"].side_effect = create_side_effect
+        run_loop(cfg)
+
+        worktrees = {c.args[3] for c in wt_mocks["worker_loop"].call_args_list}
+        assert worktrees == {Path("/tmp/wt-w0"), Path("/tmp/wt-w1")}
 
 
 class TestCoordinatorConfig:
-    def test_coordinator_gets_config(self, workspace: Path):
+    def test_coordinator_gets_config(self, workspace: Path, wt_mocks: dict, make_task):
         """MergeCoordinator 收到 resolve_conflicts 等配置."""
         cfg = Config(
             workspace=str(workspace), max_workers=2, use_worktree=True,
             resolve_conflicts=True, conflict_timeout=90,
             use_docker=True, docker_image="my-img", docker_extra_args="--net=none",
         )
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         with (
-            patch("vibe.loop.is_git_repo", return_value=True),
-            patch("vibe.loop.cleanup_stale_worktrees"),
-            patch("vibe.loop.create_worktree", side_effect=[Path("/tmp/wt0"), Path("/tmp/wt1")]),
-            patch("vibe.loop.worker_loop"),
-            patch("vibe.loop.MergeCoordinator") as mock_mc,
-            patch("vibe.loop.remove_worktree"),
             patch("vibe.loop.check_docker_available", return_value=(True, "ok")),
             patch("vibe.loop.ensure_docker_image", return_value=(True, "ok")),
         ):
             run_loop(cfg)
 
+        mock_mc = wt_mocks["MergeCoordinator"]
         mock_mc.assert_called_once()
         _, kwargs = mock_mc.call_args
         assert kwargs["resolve_conflicts"] is True
@@ -160,21 +238,14 @@ class TestCoordinatorConfig:
         assert kwargs["docker_image"] == "my-img"
         assert kwargs["docker_extra_args"] == "--net=none"
 
-    def test_worktree_passes_sync_callback(self, workspace: Path):
+    def test_worktree_passes_sync_callback(self, workspace: Path, wt_mocks: dict, make_task):
         """on_before_task 被传递给每个 worker."""
         cfg = Config(workspace=str(workspace), max_workers=2, use_worktree=True)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
-        with (
-            patch("vibe.loop.is_git_repo", return_value=True),
-            patch("vibe.loop.cleanup_stale_worktrees"),
-            patch("vibe.loop.create_worktree", side_effect=[Path("/tmp/wt0"), Path("/tmp/wt1")]),
-            patch("vibe.loop.worker_loop") as mock_wl,
-            patch("vibe.loop.MergeCoordinator"),
-            patch("vibe.loop.remove_worktree"),
-        ):
-            run_loop(cfg)
+        run_loop(cfg)
 
+        mock_wl = wt_mocks["worker_loop"]
         assert mock_wl.call_count == 2
         for c in mock_wl.call_args_list:
             cb = c.kwargs.get("on_before_task")
@@ -183,10 +254,10 @@ class TestCoordinatorConfig:
 
 
 class TestDockerPreCheck:
-    def test_docker_unavailable_raises(self, workspace: Path):
+    def test_docker_unavailable_raises(self, workspace: Path, make_task):
         """use_docker=True + Docker 不可用 → RuntimeError."""
         cfg = Config(workspace=str(workspace), use_docker=True)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         with (
             patch("vibe.loop.check_docker_available", return_value=(False, "not installed")),
@@ -194,10 +265,10 @@ class TestDockerPreCheck:
         ):
             run_loop(cfg)
 
-    def test_docker_image_missing_raises(self, workspace: Path):
+    def test_docker_image_missing_raises(self, workspace: Path, make_task):
         """use_docker=True + 镜像不存在且构建失败 → RuntimeError."""
         cfg = Config(workspace=str(workspace), use_docker=True)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         with (
             patch("vibe.loop.check_docker_available", return_value=(True, "ok")),
@@ -206,10 +277,10 @@ class TestDockerPreCheck:
         ):
             run_loop(cfg)
 
-    def test_docker_ok_continues(self, workspace: Path):
+    def test_docker_ok_continues(self, workspace: Path, make_task):
         """use_docker=True + Docker 正常 → 正常执行."""
         cfg = Config(workspace=str(workspace), use_docker=True)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         with (
             patch("vibe.loop.check_docker_available", return_value=(True, "ok")),
@@ -219,9 +290,9 @@ class TestDockerPreCheck:
             run_loop(cfg)
         mock_wl.assert_called_once()
 
-    def test_no_docker_skips_checks(self, config: Config, workspace: Path):
+    def test_no_docker_skips_checks(self, config: Config, workspace: Path, make_task):
         """use_docker=False → 不调用 Docker 检查."""
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         with (
             patch("vibe.loop.check_docker_available") as mock_check,
@@ -231,6 +302,32 @@ class TestDockerPreCheck:
         mock_check.assert_not_called()
 
 
+class _ScriptedShutdown:
+    """替代 shutdown_event 的轮询桩：wait() 不真正等待.
+
+    每次 wait 依次执行一个预设动作并返回 False（继续轮询）；动作用完后置位并返回 True。
+    """
+
+    def __init__(self, *actions: Callable[[], None]) -> None:
+        self._actions = list(actions)
+        self._flag = False
+        self.waits: list[float | None] = []
+
+    def is_set(self) -> bool:
+        return self._flag
+
+    def set(self) -> None:
+        self._flag = True
+
+    def wait(self, timeout: float | None = None) -> bool:
+        self.waits.append(timeout)
+        if self._actions:
+            self._actions.pop(0)()
+        else:
+            self._flag = True
+        return self._flag
+
+
 class TestContinuousMode:
     """测试 continuous=True 持续轮询模式."""
 
@@ -249,24 +346,23 @@ class TestContinuousMode:
     def test_continuous_true_no_tasks_waits_then_exits(self, workspace: Path):
         """continuous=True + 无任务 → 等待轮询，shutdown_event 后退出."""
         cfg = Config(workspace=str(workspace), poll_interval=1)
+        fake_shutdown = _ScriptedShutdown()
 
-        # 在短延迟后触发 shutdown_event
-        def _set_shutdown():
-            shutdown_event.set()
-
-        timer = threading.Timer(0.3, _set_shutdown)
-        timer.start()
-
-        with patch("vibe.loop.worker_loop") as mock_wl:
+        with (
+            patch("vibe.loop.shutdown_event", fake_shutdown),
+            patch("vibe.loop.worker_loop") as mock_wl,
+        ):
             run_loop(cfg, continuous=True)
 
         mock_wl.assert_not_called()
+        assert fake_shutdown.waits == [1]
 
     def test_continuous_true_processes_then_polls(self, workspace: Path):
         """continuous=True + 有任务 → 处理完后继续轮询，直到 shutdown."""
         cfg = Config(workspace=str(workspace), poll_interval=1)
         task_file = workspace / "tasks" / "001_test.md"
         task_file.write_text("task", encoding="utf-8")
+        fake_shutdown = _ScriptedShutdown(lambda: None)
 
         call_count = 0
 
@@ -277,23 +373,48 @@ class TestContinuousMode:
             if task_file.exists():
                 task_file.unlink()
 
-        # 在 worker 执行后短延迟触发 shutdown
-        def _set_shutdown():
-            shutdown_event.set()
+        with (
+            patch("vibe.loop.shutdown_event", fake_shutdown),
+            patch("vibe.loop.worker_loop", side_effect=mock_worker),
+        ):
+            run_loop(cfg, continuous=True)
+
+        assert call_count == 1
+        # 处理完后等待一次（无新任务），再次等待时收到关闭信号
+        assert fake_shutdown.waits == [1, 1]
+
+    def test_worker_crash_stops_continuous_loop(self, workspace: Path, make_task):
+        """serve 模式下 worker 异常 → 任务循环结束，shutdown_event 保持置位，后续 run_loop 不再调度."""
+        cfg = Config(workspace=str(workspace), max_workers=2, poll_interval=1)
+        make_task()
 
-        timer = threading.Timer(0.5, _set_shutdown)
-        timer.start()
+        def worker(worker_id, *args, **kwargs):
+            if worker_id == "w0":
+                raise RuntimeError("worker crashed")
+            shutdown_event.wait(timeout=5)
 
-        with patch("vibe.loop.worker_loop", side_effect=mock_worker):
+        with (
+            patch("vibe.loop.is_git_repo", return_value=False),
+            patch("vibe.loop.worker_loop", side_effect=worker),
+            pytest.raises(RuntimeError, match="worker crashed"),
+        ):
             run_loop(cfg, continuous=True)
 
-        assert call_count == 1
+        assert shutdown_event.is_set()
+        with patch("vibe.loop.worker_loop") as mock_wl:
+            run_loop(cfg, continuous=True)
+        mock_wl.assert_not_called()
 
     def test_continuous_true_picks_up_new_tasks(self, workspace: Path):
         """continuous=True → 第一轮无任务，第二轮有新任务 → 执行新任务."""
         cfg = Config(workspace=str(workspace), poll_interval=1)
         task_dir = workspace / "tasks"
 
+        def _add_task():
+            (task_dir / "001_new.md").write_text("new task", encoding="utf-8")
+
+        # 第一次轮询等待期间添加新任务，之后关闭
+        fake_shutdown = _ScriptedShutdown(_add_task)
         worker_called = threading.Event()
 
         def mock_worker(*args, **kwargs):
@@ -302,20 +423,10 @@ class TestContinuousMode:
                 f.unlink()
             worker_called.set()
 
-        # 延迟添加任务
-        def _add_task():
-            (task_dir / "001_new.md").write_text("new task", encoding="utf-8")
-
-        def _set_shutdown():
-            shutdown_event.set()
-
-        # 0.3s 后添加新任务，1.5s 后关闭
-        timer_add = threading.Timer(0.3, _add_task)
-        timer_shutdown = threading.Timer(2.5, _set_shutdown)
-        timer_add.start()
-        timer_shutdown.start()
-
-        with patch("vibe.loop.worker_loop", side_effect=mock_worker):
+        with (
+            patch("vibe.loop.shutdown_event", fake_shutdown),
+            patch("vibe.loop.worker_loop", side_effect=mock_worker),
+        ):
             run_loop(cfg, continuous=True)
 
         assert worker_called.is_set()
@@ -1,108 +1,163 @@
 """测试 __main__.py — CLI argparse 和子命令调度."""
 
+import logging
+import sys
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 import pytest
 
-from vibe.__main__ import main
+from vibe.__main__ import _configure_root_logging, _setup_logging, main
+from vibe.config import Config
+
+
+@pytest.fixture(autouse=True)
+def _restore_root_logging():
+    """main() 会改写 root logger 的级别和所有 handler 的格式，测试后原样恢复."""
+    root = logging.getLogger()
+    saved_level, saved_handlers = root.level, root.handlers[:]
+    saved_state = [(h, h.level, h.formatter) for h in saved_handlers]
+    yield
+    for h in root.handlers:
+        if h not in saved_handlers:
+            h.close()
+    root.handlers = saved_handlers
+    root.setLevel(saved_level)
+    for h, level, formatter in saved_state:
+        h.setLevel(level)
+        h.setFormatter(formatter)
+
+
+@pytest.fixture
+def cli_cfg(workspace: Path):
+    """patch load_config / run_loop，返回 (load_config 返回的真实 Config, run_loop mock)."""
+    cfg = Config(workspace=str(workspace))
+    with (
+        patch("vibe.__main__.load_config", return_value=cfg),
+        patch("vibe.__main__.run_loop") as mock_loop,
+    ):
+        yield cfg, mock_loop
 
 
 class TestCLIRun:
-    @patch("vibe.__main__.run_loop")
-    @patch("vibe.__main__.load_config")
-    def test_run_basic(self, mock_load, mock_loop, workspace: Path):
-        cfg = MagicMock()
-        cfg.workspace = str(workspace)
-        cfg.log_level = "INFO"
-        cfg.log_file = ""
-        cfg.plan_mode = False
-        cfg.plan_auto_approve = True
-        mock_load.return_value = cfg
-
-        with patch("sys.argv", ["vibe", "run"]):
-            main()
+    def test_run_basic(self, cli_cfg, monkeypatch):
+        _, mock_loop = cli_cfg
+        monkeypatch.setattr(sys, "argv", ["vibe", "run"])
+        main()
         mock_loop.assert_called_once()
 
-    @patch("vibe.__main__.run_loop")
-    @patch("vibe.__main__.load_config")
-    def test_run_with_workers(self, mock_load, mock_loop, workspace: Path):
-        cfg = MagicMock()
-        cfg.workspace = str(workspace)
-        cfg.log_level = "INFO"
-        cfg.log_file = ""
-        cfg.plan_mode = False
-        cfg.plan_auto_approve = True
-        mock_load.return_value = cfg
-
-        with patch("sys.argv", ["vibe", "run", "-n", "4"]):
-            main()
-        assert cfg.max_workers == 4
-
-    @patch("vibe.__main__.run_loop")
-    @patch("vibe.__main__.load_config")
-    def test_run_plan_mode_auto_approve_override(self, mock_load, mock_loop, workspace: Path):
-        cfg = MagicMock()
-        cfg.workspace = str(workspace)
-        cfg.log_level = "INFO"
-        cfg.log_file = ""
-        cfg.plan_mode = False
+    @pytest.mark.parametrize(
+        ("args", "attr", "expected"),
+        [
+            (["-n", "4"], "max_workers", 4),
+            (["--verbose"], "verbose", True),
+        ],
+    )
+    def test_run_flag_sets_config(self, cli_cfg, args, attr, expected, monkeypatch):
+        cfg, _ = cli_cfg
+        monkeypatch.setattr(sys, "argv", ["vibe", "run", *args])
+        main()
+        assert getattr(cfg, attr) == expected
+
+    def test_run_plan_mode_auto_approve_override(self, cli_cfg, caplog, monkeypatch):
+        cfg, _ = cli_cfg
         cfg.plan_auto_approve = False
-        mock_load.return_value = cfg
 
-        with patch("sys.argv", ["vibe", "run", "--plan-mode"]):
-            main()
+        monkeypatch.setattr(sys, "argv", ["vibe", "run", "--plan-mode"])
+        main()
         # plan_auto_approve should be overridden to True in CLI mode
         assert cfg.plan_auto_approve is True
+        assert "plan_auto_approve=False" in caplog.text
 
 
-    @patch("vibe.__main__.run_loop")
-    @patch("vibe.__main__.load_config")
-    def test_run_verbose(self, mock_load, mock_loop, workspace: Path):
-        cfg = MagicMock()
-        cfg.workspace = str(workspace)
-        cfg.log_level = "INFO"
-        cfg.log_file = ""
-        cfg.plan_mode = False
-        cfg.plan_auto_approve = True
-        mock_load.return_value = cfg
-
-        with patch("sys.argv", ["vibe", "run", "--verbose"]):
-            main()
-        assert cfg.verbose is True
+class TestCLIServe:
+    @patch("vibe.server.start_server")
+    def test_serve_starts_server(self, mock_start, workspace: Path, monkeypatch):
+        monkeypatch.setattr(sys, "argv", ["vibe", "serve", "-w", str(workspace), "--port", "9000"])
+        main()
+        mock_start.assert_called_once()
+        config = mock_start.call_args[0][0]
+        assert config.workspace == str(workspace.resolve())
+        assert mock_start.call_args.kwargs["port"] == 9000
 
 
 class TestCLIList:
-    def test_list(self, workspace: Path, capsys):
+    def test_list(self, workspace: Path, capsys, monkeypatch):
         (workspace / "tasks" / "001_todo.md").write_text("task", encoding="utf-8")
 
-        with patch("sys.argv", ["vibe", "list", "-w", str(workspace)]):
-            main()
+        monkeypatch.setattr(sys, "argv", ["vibe", "list", "-w", str(workspace)])
+        main()
         out = capsys.readouterr().out
         assert "pending" in out.lower() or "001_todo" in out
 
+    def test_list_sections(self, workspace: Path, capsys, monkeypatch):
+        tasks = workspace / "tasks"
+        (tasks / "002_b.md").write_text("b", encoding="utf-8")
+        (tasks / "001_a.md").write_text("a", encoding="utf-8")
+        (tasks / "003_c.md.running.w0").write_text("c", encoding="utf-8")
+        (tasks / "done" / "20240101_000000_004_d.md").write_text("d", encoding="utf-8")
+
+        monkeypatch.setattr(sys, "argv", ["vibe", "list", "-w", str(workspace)])
+        main()
+        out = capsys.readouterr().out
+        pending, running, done, failed = out.split("===")[2::2]
+        assert pending.split() == ["001_a.md", "002_b.md"]
+        assert running.split() == ["003_c.md.running.w0"]
+        assert done.split() == ["20240101_000000_004_d.md"]
+        assert failed.split() == ["(无)"]
+
 
 class TestCLIAdd:
-    def test_add(self, workspace: Path, capsys):
-        with patch("sys.argv", ["vibe", "add", "new task", "-w", str(workspace)]):
-            main()
+    def test_add(self, workspace: Path, capsys, monkeypatch):
+        monkeypatch.setattr(sys, "argv", ["vibe", "add", "new task", "-w", str(workspace)])
+        main()
         out = capsys.readouterr().out
         assert "001_" in out
         md_files = list((workspace / "tasks").glob("*.md"))
         assert len(md_files) == 1
 
+    def test_add_with_depends_exact_bytes(self, workspace: Path, capsys, monkeypatch):
+        argv = ["vibe", "add", "新任务", "--after", "001, 002", "-w", str(workspace)]
+        monkeypatch.setattr(sys, "argv", argv)
+        main()
+        (task_file,) = (workspace / "tasks").glob("*.md")
+        assert task_file.read_bytes() == "<!-- DEPENDS: 001, 002 -->\n新任务\n".encode("utf-8")
+
 
 class TestCLIRecover:
-    def test_recover_none(self, workspace: Path, capsys):
-        with patch("sys.argv", ["vibe", "recover", "-w", str(workspace)]):
-            main()
+    def test_recover_none(self, workspace: Path, capsys, monkeypatch):
+        monkeypatch.setattr(sys, "argv", ["vibe", "recover", "-w", str(workspace)])
+        main()
         out = capsys.readouterr().out
         assert "没有" in out or "0" in out
 
 
+class TestLoggingSetup:
+    """测试内直接清空 root handlers，由 autouse 的 _restore_root_logging 在测试后恢复."""
+
+    def test_reconfigure_updates_existing_handler(self):
+        root = logging.getLogger()
+        root.handlers = []
+        _configure_root_logging(logging.WARNING, "%(asctime)s %(message)s")
+        handlers = root.handlers[:]
+        _configure_root_logging(logging.DEBUG, "%(message)s")
+        assert root.handlers == handlers
+        assert root.level == logging.DEBUG
+        assert all(h.formatter._fmt == "%(message)s" for h in handlers)
+
+    def test_log_file_added_once(self, workspace: Path):
+        root = logging.getLogger()
+        root.handlers = []
+        cfg = Config(workspace=str(workspace), log_file=str(workspace / "vibe.log"))
+        _setup_logging(cfg)
+        _setup_logging(cfg)
+        file_handlers = [h for h in root.handlers if isinstance(h, logging.FileHandler)]
+        assert len(file_handlers) == 1
+
+
 class TestCLINoCommand:
-    def test_no_command_exits(self):
-        with patch("sys.argv", ["vibe"]):
-            with pytest.raises(SystemExit) as exc_info:
-                main()
-            assert exc_info.value.code == 1
+    def test_no_command_exits(self, monkeypatch):
+        monkeypatch.setattr(sys, "argv", ["vibe"])
+        with pytest.raises(SystemExit) as exc_info:
+            main()
+        assert exc_info.value.code == 1
@@ -2,23 +2,86 @@
 
 import io
 import json
+import os
+import subprocess
 import threading
+import time
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
 
 from vibe.manager import (
-    CONFLICT_RESOLUTION_PROMPT,
-    TaskResult, _build_docker_cmd, _parse_stream_json, _read_stream,
+    _READY_IMAGES, CONFLICT_RESOLUTION_PROMPT,
+    _build_docker_cmd, _docker_static_args, _LineReader, _parse_stream_json, _read_stream,
+    _live_procs, _read_streams, _resolve_cwd, _StreamParser,
     _run_claude, check_docker_available, ensure_docker_image,
     execute_plan, generate_plan, resolve_conflicts, run_plan, run_task,
 )
 
 
+def _text_event_line(text: str) -> bytes:
+    """stream-json 中一条 assistant 文本事件（含换行），作为子进程 stdout 字节."""
+    event = {"type": "assistant", "message": {"content": [{"type": "text", "text": text}]}}
+    return json.dumps(event).encode() + b"\n"
+
+
+class _FakeProc:
+    """subprocess.Popen 的轻量替身：固定输出、立即以 returncode 退出.
+
+    不依赖 MagicMock，避免每个测试构造 mock 及逐属性访问的开销；
+    需要自定义 wait/terminate 行为的测试直接替换实例上的方法。
+    """
+
+    pid = 4242
+
+    def __init__(self, stdout: bytes = b"", stderr: bytes = b"", returncode: int = 0) -> None:
+        self.stdout = io.BytesIO(stdout)
+        self.stderr = io.BytesIO(stderr)
+        self.returncode = returncode
+        self.terminate_calls = 0
+        self.kill_calls = 0
+
+    def wait(self, timeout: float | None = None) -> int:
+        return self.returncode
+
+    def poll(self) -> int | None:
+        return self.returncode
+
+    def terminate(self) -> None:
+        self.terminate_calls += 1
+
+    def kill(self) -> None:
+        self.kill_calls += 1
+
+
+def _popen_sequence(*stdouts: bytes):
+    """Popen 的 side_effect：第 N 次调用返回以 stdouts[N] 为输出的 _FakeProc."""
+    outputs = iter(stdouts)
+    return lambda *args, **kwargs: _FakeProc(next(outputs))
+
+
+def _pipe_stream(data: bytes):
+    """写入 data 后关闭写端，返回真实管道的无缓冲读端（与子进程输出同一代码路径）."""
+    r, w = os.pipe()
+    os.write(w, data)
+    os.close(w)
+    return open(r, "rb", buffering=0)
+
+
 # ── _parse_stream_json ───────────────────────────────────────
 
 class TestParseStreamJson:
+    @pytest.fixture(autouse=True, params=["json", "orjson"])
+    def decode_backend(self, request):
+        """两种 JSON 解码后端都跑一遍解析测试."""
+        if request.param == "orjson":
+            decode = pytest.importorskip("orjson").loads
+        else:
+            decode = json.JSONDecoder().decode
+        with patch("vibe.manager._decode_json", decode):
+            yield
+
     def test_empty(self):
         result = _parse_stream_json([])
         assert result.success is True
@@ -66,6 +129,42 @@ class TestParseStreamJson:
         result = _parse_stream_json(["not json at all"])
         assert "not json at all" in result.output
 
+    def test_non_object_json(self):
+        """非对象 JSON 行（数组、数字）按普通输出处理."""
+        result = _parse_stream_json(["[1, 2]", "42"])
+        assert result.output == "[1, 2]\n42"
+        assert result.tool_calls == []
+
+    def test_uninteresting_events_skip_decode(self):
+        """不含关心事件类型的行不做 JSON 解析."""
+        system = json.dumps({"type": "system", "subtype": "init", "cwd": "/x"})
+        result_line = json.dumps({"type": "result", "result": "ok"})
+        with patch("vibe.manager._decode_json", wraps=json.loads) as mock_decode:
+            result = _parse_stream_json([system, result_line])
+        assert mock_decode.call_count == 1
+        assert result.output == "ok"
+
+    def test_brace_prefixed_non_event_kept(self):
+        """以 { 开头但不是合法 JSON 的行（诊断信息、残缺 JSON）作为普通输出保留."""
+        lines = ["{not an event}", '{"partial": ', '{"type" broken}']
+        result = _parse_stream_json(lines)
+        assert result.output == '{not an event}\n{"partial":\n{"type" broken}'
+
+    def test_object_without_type_ignored(self):
+        """合法但不含 type 的 JSON 对象经解码后忽略，不作为输出."""
+        result = _parse_stream_json(['{"foo":1}', json.dumps({"type": "result", "result": "ok"})])
+        assert result.output == "ok"
+
+    def test_unknown_or_invalid_type_ignored(self):
+        """未知或非字符串 type 的事件被忽略."""
+        lines = [
+            json.dumps({"type": ["result"], "result": "x"}),
+            json.dumps({"type": "tool_result_v2", "result": "y"}),
+        ]
+        result = _parse_stream_json(lines)
+        assert result.output == ""
+        assert result.tool_results == []
+
     def test_result_event(self):
         event = {"type": "result", "result": "final answer"}
         result = _parse_stream_json([json.dumps(event)])
@@ -94,18 +193,32 @@ class TestParseStreamJson:
         assert len(result.tool_results) == 1
         assert result.tool_results[0]["is_error"] is True
 
+    def test_files_changed_deduplicated(self):
+        """同一文件多次编辑只记录一次，保持首次出现顺序."""
+        def edit(path: str) -> str:
+            return json.dumps({
+                "type": "assistant",
+                "message": {"content": [
+                    {"type": "tool_use", "name": "Edit", "input": {"file_path": path}}
+                ]},
+            })
+
+        result = _parse_stream_json([edit("/b.py"), edit("/a.py"), edit("/b.py")])
+        assert result.files_changed == ["/b.py", "/a.py"]
+        assert len(result.tool_calls) == 3
+
 
 # ── _read_stream ─────────────────────────────────────────────
 
 class TestReadStream:
     def test_basic(self):
-        stream = io.BytesIO(b"line1\nline2\n")
+        stream = _pipe_stream(b"line1\nline2\n")
         lines: list[str] = []
         _read_stream(stream, lines)
         assert lines == ["line1", "line2"]
 
     def test_on_line_callback(self):
-        stream = io.BytesIO(b"line1\nline2\n")
+        stream = _pipe_stream(b"line1\nline2\n")
         lines: list[str] = []
         callback_lines: list[str] = []
         _read_stream(stream, lines, on_line=callback_lines.append)
@@ -113,7 +226,7 @@ class TestReadStream:
 
     def test_on_line_exception_does_not_crash(self):
         """on_line 抛异常不影响读取."""
-        stream = io.BytesIO(b"line1\nline2\n")
+        stream = _pipe_stream(b"line1\nline2\n")
         lines: list[str] = []
 
         def bad_callback(line: str) -> None:
@@ -129,10 +242,77 @@ class TestReadStream:
         _read_stream(stream, lines, on_line=None)
         assert lines == ["line1"]
 
+    def test_lines_split_across_chunks(self):
+        """跨读取块的行与多字节字符被正确拼接."""
+        data = "第一行\n第二行\n末尾无换行".encode()
+        stream = io.BytesIO(data)
+        lines: list[str] = []
+        with patch("vibe.manager._READ_CHUNK", 4):
+            _read_stream(stream, lines)
+        assert lines == ["第一行", "第二行", "末尾无换行"]
+
+    def test_many_lines_one_read(self):
+        """一个读取块内的多行只需一次 read 调用（外加 EOF）."""
+        stream = io.BytesIO(b"".join(b"line%d\n" % i for i in range(1000)))
+        lines: list[str] = []
+        with patch.object(stream, "read", wraps=stream.read) as mock_read:
+            _read_stream(stream, lines)
+        assert mock_read.call_count == 2
+        assert len(lines) == 1000
+        assert lines[-1] == "line999"
+
+    def test_parser_without_lines(self):
+        """提供 parser 且 lines=None 时边读边解析，不保留原始行."""
+        event = {"type": "result", "result": "final"}
+        stream = io.BytesIO(json.dumps(event).encode() + b"\nplain\n")
+        parser = _StreamParser()
+        _read_stream(stream, None, parser=parser)
+        result = parser.result()
+        assert result.result_text == "final"
+        assert result.output == "final\nplain"
+
+
+class TestReadStreams:
+    def test_reads_pipes_in_one_thread(self):
+        """同一线程通过 selector 读取两个真实管道直到 EOF."""
+        out_lines: list[str] = []
+        err_lines: list[str] = []
+
+        _read_streams([
+            (_pipe_stream(b"out1\nout2"), _LineReader(out_lines)),
+            (_pipe_stream(b"err1\n"), _LineReader(err_lines)),
+        ])
+        assert out_lines == ["out1", "out2"]
+        assert err_lines == ["err1"]
+
+    def test_memory_stream_fallback(self):
+        """无文件描述符的流顺序读取."""
+        lines: list[str] = []
+        _read_streams([(io.BytesIO(b"a\nb\n"), _LineReader(lines))])
+        assert lines == ["a", "b"]
+
 
 # ── _build_docker_cmd ────────────────────────────────────────
 
+_DOCKER_VALUE_FLAGS = frozenset({"-v", "-e", "-w", "--user"})
+
+
+def _parse_docker_argv(argv: list[str]) -> dict[str, list[str]]:
+    """单次遍历 docker 命令，收集带值参数：{"-v": [...], "-e": [...], ...}."""
+    flags: dict[str, list[str]] = {flag: [] for flag in _DOCKER_VALUE_FLAGS}
+    for i, tok in enumerate(argv):
+        if tok in _DOCKER_VALUE_FLAGS:
+            flags[tok].append(argv[i + 1])
+    return flags
+
+
 class TestBuildDockerCmd:
+    @pytest.fixture(autouse=True)
+    def _clear_static_cache(self):
+        _docker_static_args.cache_clear()
+        yield
+        _docker_static_args.cache_clear()
+
     def test_basic(self, tmp_path):
         claude_cmd = ["claude", "-p", "hello", "--output-format", "stream-json"]
         # 创建 ~/.claude.json 模拟文件
@@ -150,9 +330,8 @@ class TestBuildDockerCmd:
         assert result[:2] == ["docker", "run"]
         assert "--rm" in result
         assert "-i" not in result  # no interactive flag for batch mode
-        assert "-v" in result
-        # 收集所有 -v 挂载
-        volumes = [result[i + 1] for i, v in enumerate(result) if v == "-v"]
+        flags = _parse_docker_argv(result)
+        volumes = flags["-v"]
         assert "/my/project:/workspace" in volumes
         assert f"{fake_home / '.claude'}:/home/user/.claude" in volumes
         assert f"{fake_home / '.claude.json'}:/home/user/.claude.json" in volumes
@@ -161,16 +340,13 @@ class TestBuildDockerCmd:
             if "/home/user/.claude" in v:
                 assert ":ro" not in v, f"mount should be rw: {v}"
         # --user UID:GID
-        user_idx = result.index("--user")
-        assert result[user_idx + 1] == "1000:1000"
+        assert flags["--user"] == ["1000:1000"]
         # -w /workspace
-        w_idx = result.index("-w")
-        assert result[w_idx + 1] == "/workspace"
+        assert flags["-w"] == ["/workspace"]
         # -e HOME=/home/user 确保容器 HOME 指向挂载路径
-        env_args = [result[i + 1] for i, v in enumerate(result) if v == "-e"]
-        assert "HOME=/home/user" in env_args
+        assert "HOME=/home/user" in flags["-e"]
         # -e ANTHROPIC_API_KEY
-        assert "ANTHROPIC_API_KEY" in env_args
+        assert "ANTHROPIC_API_KEY" in flags["-e"]
         # 镜像名
         assert "my-image" in result
         # claude 命令在末尾
@@ -188,7 +364,7 @@ class TestBuildDockerCmd:
             patch("os.getuid", return_value=0),
         ):
             result = _build_docker_cmd(claude_cmd, Path("/proj"), "img")
-        assert "--user" not in result
+        assert _parse_docker_argv(result)["--user"] == []
 
     def test_extra_args(self):
         claude_cmd = ["claude", "-p", "hi"]
@@ -198,6 +374,27 @@ class TestBuildDockerCmd:
         assert "--network=none" in result
         assert "--memory=4g" in result
 
+    def test_static_args_cached(self):
+        """相同参数只查询一次 UID/GID，claude 命令每次单独拼接."""
+        with patch("os.getuid", return_value=1000) as mock_uid:
+            first = _build_docker_cmd(["claude", "-p", "a"], Path("/proj"), "img")
+            second = _build_docker_cmd(["claude", "-p", "b"], Path("/proj"), "img")
+        assert mock_uid.call_count == 1
+        assert first[:-1] == second[:-1]
+        assert second[-1] == "b"
+
+    def test_claude_json_created_later_is_mounted(self, tmp_path):
+        """~/.claude.json 在首次调用后才创建时，后续命令仍会挂载它."""
+        fake_home = tmp_path / "home"
+        fake_home.mkdir()
+        mount = f"{fake_home / '.claude.json'}:/home/user/.claude.json"
+        with patch("vibe.manager.Path.home", return_value=fake_home):
+            first = _build_docker_cmd(["claude"], Path("/proj"), "img")
+            (fake_home / ".claude.json").write_text("{}", encoding="utf-8")
+            second = _build_docker_cmd(["claude"], Path("/proj"), "img")
+        assert mount not in _parse_docker_argv(first)["-v"]
+        assert mount in _parse_docker_argv(second)["-v"]
+
     def test_no_extra_args(self):
         claude_cmd = ["claude", "-p", "hi"]
         result = _build_docker_cmd(claude_cmd, Path("/proj"), "img", "")
@@ -205,105 +402,101 @@ class TestBuildDockerCmd:
         assert "" not in result
 
 
-# ── check_docker_available ───────────────────────────────────
+# ── _resolve_cwd ─────────────────────────────────────────────
 
-class TestCheckDockerAvailable:
-    def test_available(self):
-        mock_result = MagicMock()
-        mock_result.returncode = 0
-        with patch("vibe.manager.subprocess.run", return_value=mock_result):
-            ok, msg = check_docker_available()
-        assert ok is True
+class TestResolveCwd:
+    def test_absolute_path_unchanged(self, tmp_path):
+        with patch("vibe.manager.Path.resolve") as mock_resolve:
+            assert _resolve_cwd(tmp_path) is tmp_path
+        mock_resolve.assert_not_called()
 
-    def test_not_available(self):
-        mock_result = MagicMock()
-        mock_result.returncode = 1
-        mock_result.stderr = b"Cannot connect to Docker daemon"
-        with patch("vibe.manager.subprocess.run", return_value=mock_result):
-            ok, msg = check_docker_available()
-        assert ok is False
-        assert "不可用" in msg
+    def test_relative_resolved(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        assert _resolve_cwd("sub") == (tmp_path / "sub").resolve()
+        assert _resolve_cwd(str(tmp_path)) == tmp_path.resolve()
 
-    def test_not_installed(self):
-        with patch("vibe.manager.subprocess.run", side_effect=FileNotFoundError):
-            ok, msg = check_docker_available()
-        assert ok is False
-        assert "未找到" in msg
 
-    def test_timeout(self):
-        import subprocess
-        with patch("vibe.manager.subprocess.run", side_effect=subprocess.TimeoutExpired("docker", 10)):
+# ── check_docker_available ───────────────────────────────────
+
+class TestCheckDockerAvailable:
+    @pytest.mark.parametrize(
+        ("run_kwargs", "expect_ok", "expect_msg"),
+        [
+            ({"return_value": MagicMock(returncode=0)}, True, ""),
+            (
+                {"return_value": MagicMock(returncode=1, stderr=b"Cannot connect to Docker daemon")},
+                False, "不可用",
+            ),
+            ({"side_effect": FileNotFoundError}, False, "未找到"),
+            ({"side_effect": subprocess.TimeoutExpired("docker", 10)}, False, "超时"),
+        ],
+        ids=["available", "not_available", "not_installed", "timeout"],
+    )
+    def test_check(self, run_kwargs, expect_ok, expect_msg):
+        with patch("vibe.manager.subprocess.run", **run_kwargs):
             ok, msg = check_docker_available()
-        assert ok is False
-        assert "超时" in msg
+        assert ok is expect_ok
+        assert expect_msg in msg
 
 
 # ── ensure_docker_image ──────────────────────────────────────
 
 class TestEnsureDockerImage:
-    def test_image_exists(self):
+    @pytest.fixture(autouse=True)
+    def _clear_cache(self):
+        _READY_IMAGES.clear()
+        yield
+        _READY_IMAGES.clear()
+
+    @pytest.mark.parametrize(
+        ("results", "has_dockerfile", "expect_ok", "expect_msg"),
+        [
+            ([MagicMock(returncode=0)], False, True, "已存在"),
+            ([MagicMock(returncode=1)], False, False, "Dockerfile"),
+            # docker image inspect → 不存在；docker build → 成功 / 失败
+            ([MagicMock(returncode=1), MagicMock(returncode=0)], True, True, "构建成功"),
+            (
+                [MagicMock(returncode=1), MagicMock(returncode=1, stderr=b"build error")],
+                True, False, "构建失败",
+            ),
+        ],
+        ids=["exists", "missing_no_dockerfile", "build_success", "build_failure"],
+    )
+    def test_ensure(self, tmp_path, results, has_dockerfile, expect_ok, expect_msg):
+        if has_dockerfile:
+            (tmp_path / "Dockerfile").write_text("FROM ubuntu", encoding="utf-8")
+        with patch("vibe.manager.subprocess.run", side_effect=results) as mock_run:
+            ok, msg = ensure_docker_image("my-image", tmp_path)
+        assert ok is expect_ok
+        assert expect_msg in msg
+        assert mock_run.call_count == len(results)
+
+    def test_success_cached(self):
+        """镜像确认存在后，再次调用不再启动 docker 子进程."""
         mock_result = MagicMock()
         mock_result.returncode = 0
-        with patch("vibe.manager.subprocess.run", return_value=mock_result):
+        with patch("vibe.manager.subprocess.run", return_value=mock_result) as mock_run:
+            assert ensure_docker_image("my-image")[0] is True
             ok, msg = ensure_docker_image("my-image")
         assert ok is True
         assert "已存在" in msg
+        assert mock_run.call_count == 1
 
-    def test_image_not_exists_no_dockerfile(self, tmp_path):
+    def test_failure_not_cached(self, tmp_path):
+        """检查失败不缓存，下次调用会重新 inspect."""
         inspect_result = MagicMock()
         inspect_result.returncode = 1
-        with patch("vibe.manager.subprocess.run", return_value=inspect_result):
-            ok, msg = ensure_docker_image("my-image", tmp_path)
-        assert ok is False
-        assert "Dockerfile" in msg
-
-    def test_image_not_exists_build_success(self, tmp_path):
-        (tmp_path / "Dockerfile").write_text("FROM ubuntu", encoding="utf-8")
-
-        call_count = 0
-
-        def mock_run(*args, **kwargs):
-            nonlocal call_count
-            call_count += 1
-            result = MagicMock()
-            if call_count == 1:
-                # docker image inspect → 不存在
-                result.returncode = 1
-            else:
-                # docker build → 成功
-                result.returncode = 0
-            return result
-
-        with patch("vibe.manager.subprocess.run", side_effect=mock_run):
-            ok, msg = ensure_docker_image("my-image", tmp_path)
-        assert ok is True
-        assert "构建成功" in msg
-
-    def test_image_not_exists_build_failure(self, tmp_path):
-        (tmp_path / "Dockerfile").write_text("FROM ubuntu", encoding="utf-8")
-
-        call_count = 0
-
-        def mock_run(*args, **kwargs):
-            nonlocal call_count
-            call_count += 1
-            result = MagicMock()
-            if call_count == 1:
-                result.returncode = 1
-            else:
-                result.returncode = 1
-                result.stderr = b"build error"
-            return result
-
-        with patch("vibe.manager.subprocess.run", side_effect=mock_run):
-            ok, msg = ensure_docker_image("my-image", tmp_path)
-        assert ok is False
-        assert "构建失败" in msg
+        with patch("vibe.manager.subprocess.run", return_value=inspect_result) as mock_run:
+            ensure_docker_image("my-image", tmp_path)
+            ensure_docker_image("my-image", tmp_path)
+        assert mock_run.call_count == 2
 
 
 # ── run_task ─────────────────────────────────────────────────
 
 class TestRunTask:
+    DONE_STDOUT = _text_event_line("done")
+
     def test_not_found(self, tmp_path):
         with patch("vibe.manager.subprocess.Popen", side_effect=FileNotFoundError):
             result = run_task("hello", cwd=tmp_path)
@@ -311,16 +504,15 @@ class TestRunTask:
         assert "未找到" in result.error
 
     def test_timeout(self, tmp_path):
-        import subprocess
+        mock_proc = _FakeProc()
 
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(b"")
-        mock_proc.stderr = io.BytesIO(b"")
         # wait 始终超时（模拟长时间运行的进程），直到 kill 后正常返回
-        mock_proc.wait.side_effect = subprocess.TimeoutExpired("claude", 0.5)
-        mock_proc.kill.side_effect = lambda: setattr(
-            mock_proc, 'wait', MagicMock(return_value=None),
-        )
+        def fake_wait(timeout=None):
+            if not mock_proc.kill_calls:
+                raise subprocess.TimeoutExpired("claude", 0.5)
+            return mock_proc.returncode
+
+        mock_proc.wait = fake_wait
 
         with (
             patch("vibe.manager.subprocess.Popen", return_value=mock_proc),
@@ -333,17 +525,25 @@ class TestRunTask:
         assert "超时" in result.error
 
     def test_nonzero_exit(self, tmp_path):
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(b"")
-        mock_proc.stderr = io.BytesIO(b"error msg\n")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 1
+        mock_proc = _FakeProc(stderr=b"error msg\n", returncode=1)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = run_task("hello", cwd=tmp_path)
         assert result.success is False
         assert result.return_code == 1
 
+    def test_stderr_tail_bounded(self, tmp_path):
+        """stderr 只保留末尾 _STDERR_MAX_LINES 行."""
+        stderr = b"".join(b"err%d\n" % i for i in range(5))
+        mock_proc = _FakeProc(stderr=stderr, returncode=1)
+
+        with (
+            patch("vibe.manager._STDERR_MAX_LINES", 2),
+            patch("vibe.manager.subprocess.Popen", return_value=mock_proc),
+        ):
+            result = run_task("hello", cwd=tmp_path)
+        assert result.error == "退出码 1: err3\nerr4"
+
     def test_nonzero_exit_still_parses_stream(self, tmp_path):
         """非零退出码时仍然解析 stream-json 填充 tool_calls."""
         tool_event = {
@@ -363,11 +563,7 @@ class TestRunTask:
         }
         stdout = (json.dumps(tool_event) + "\n" + json.dumps(tool_result_event) + "\n").encode()
 
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(stdout)
-        mock_proc.stderr = io.BytesIO(b"error\n")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 1
+        mock_proc = _FakeProc(stdout, stderr=b"error\n", returncode=1)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = run_task("hello", cwd=tmp_path)
@@ -378,17 +574,7 @@ class TestRunTask:
         assert result.tool_results[0]["is_error"] is True
 
     def test_success(self, tmp_path):
-        event = {
-            "type": "assistant",
-            "message": {"content": [{"type": "text", "text": "done"}]},
-        }
-        stdout_bytes = json.dumps(event).encode() + b"\n"
-
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(stdout_bytes)
-        mock_proc.stderr = io.BytesIO(b"")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 0
+        mock_proc = _FakeProc(self.DONE_STDOUT)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = run_task("hello", cwd=tmp_path)
@@ -397,17 +583,7 @@ class TestRunTask:
 
     def test_docker_mode(self, tmp_path):
         """use_docker=True → Popen 收到 docker run 命令."""
-        event = {
-            "type": "assistant",
-            "message": {"content": [{"type": "text", "text": "done"}]},
-        }
-        stdout_bytes = json.dumps(event).encode() + b"\n"
-
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(stdout_bytes)
-        mock_proc.stderr = io.BytesIO(b"")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 0
+        mock_proc = _FakeProc(self.DONE_STDOUT)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc) as mock_popen:
             result = run_task(
@@ -422,6 +598,21 @@ class TestRunTask:
         assert "test-img" in actual_cmd
         # Docker 模式下 cwd 应为 None
         assert mock_popen.call_args[1]["cwd"] is None
+        # 容器环境由 -e 指定，无需复制父进程环境
+        assert mock_popen.call_args[1]["env"] is None
+
+    def test_env_drops_claudecode(self, tmp_path):
+        """本地模式下子进程环境不包含 CLAUDECODE."""
+        mock_proc = _FakeProc()
+
+        with (
+            patch.dict("os.environ", {"CLAUDECODE": "1", "KEEP_ME": "x"}),
+            patch("vibe.manager.subprocess.Popen", return_value=mock_proc) as mock_popen,
+        ):
+            run_task("hello", cwd=tmp_path)
+        env = mock_popen.call_args[1]["env"]
+        assert "CLAUDECODE" not in env
+        assert env["KEEP_ME"] == "x"
 
     def test_docker_not_found(self, tmp_path):
         """Docker 模式下 docker 不存在 → 错误消息包含 docker."""
@@ -436,13 +627,12 @@ class TestRunTask:
 # ── run_plan ─────────────────────────────────────────────────
 
 class TestRunPlan:
+    PLAN_STDOUT = _text_event_line("my plan")
+    EXEC_STDOUT = _text_event_line("executed")
+
     def test_plan_failure(self, tmp_path):
         """第一步失败 → 不执行第二步."""
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(b"")
-        mock_proc.stderr = io.BytesIO(b"plan error\n")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 1
+        mock_proc = _FakeProc(stderr=b"plan error\n", returncode=1)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = run_plan("hello", cwd=tmp_path)
@@ -451,31 +641,9 @@ class TestRunPlan:
 
     def test_success(self, tmp_path):
         """两步都成功 → 输出包含 [计划] 和 [执行结果]."""
-        plan_event = {
-            "type": "assistant",
-            "message": {"content": [{"type": "text", "text": "my plan"}]},
-        }
-        exec_event = {
-            "type": "assistant",
-            "message": {"content": [{"type": "text", "text": "executed"}]},
-        }
+        procs = _popen_sequence(self.PLAN_STDOUT, self.EXEC_STDOUT)
 
-        call_count = 0
-
-        def mock_popen(*args, **kwargs):
-            nonlocal call_count
-            call_count += 1
-            proc = MagicMock()
-            if call_count == 1:
-                proc.stdout = io.BytesIO(json.dumps(plan_event).encode() + b"\n")
-            else:
-                proc.stdout = io.BytesIO(json.dumps(exec_event).encode() + b"\n")
-            proc.stderr = io.BytesIO(b"")
-            proc.wait.return_value = None
-            proc.returncode = 0
-            return proc
-
-        with patch("vibe.manager.subprocess.Popen", side_effect=mock_popen):
+        with patch("vibe.manager.subprocess.Popen", side_effect=procs):
             result = run_plan("hello", cwd=tmp_path)
         assert result.success is True
         assert "[计划]" in result.output
@@ -485,28 +653,30 @@ class TestRunPlan:
 # ── generate_plan ────────────────────────────────────────────
 
 class TestGeneratePlan:
+    PLAN_STDOUT = _text_event_line("step 1\nstep 2")
+
     def test_success(self, tmp_path):
-        plan_event = {
-            "type": "assistant",
-            "message": {"content": [{"type": "text", "text": "step 1\nstep 2"}]},
-        }
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(json.dumps(plan_event).encode() + b"\n")
-        mock_proc.stderr = io.BytesIO(b"")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 0
+        mock_proc = _FakeProc(self.PLAN_STDOUT)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = generate_plan("hello", cwd=tmp_path)
         assert result.success is True
         assert "step 1" in result.output
 
+    def test_plan_cmd_without_skip_permissions(self, tmp_path):
+        """计划模式不带 --dangerously-skip-permissions，提示词包含原任务."""
+        mock_proc = _FakeProc()
+
+        with patch("vibe.manager.subprocess.Popen", return_value=mock_proc) as mock_popen:
+            generate_plan("do the thing", cwd=tmp_path)
+        cmd = mock_popen.call_args[0][0]
+        assert cmd[:2] == ["claude", "-p"]
+        assert cmd[2].endswith("do the thing")
+        assert "--dangerously-skip-permissions" not in cmd
+        assert cmd[-3:] == ["--output-format", "stream-json", "--verbose"]
+
     def test_failure(self, tmp_path):
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(b"")
-        mock_proc.stderr = io.BytesIO(b"error\n")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 1
+        mock_proc = _FakeProc(stderr=b"error\n", returncode=1)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = generate_plan("hello", cwd=tmp_path)
@@ -517,16 +687,10 @@ class TestGeneratePlan:
 # ── execute_plan ─────────────────────────────────────────────
 
 class TestExecutePlan:
+    EXEC_STDOUT = _text_event_line("done executing")
+
     def test_success(self, tmp_path):
-        exec_event = {
-            "type": "assistant",
-            "message": {"content": [{"type": "text", "text": "done executing"}]},
-        }
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(json.dumps(exec_event).encode() + b"\n")
-        mock_proc.stderr = io.BytesIO(b"")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 0
+        mock_proc = _FakeProc(self.EXEC_STDOUT)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = execute_plan("my plan text", cwd=tmp_path)
@@ -541,23 +705,26 @@ class TestExecutePlan:
 class TestShutdownEvent:
     def test_shutdown_terminates_process(self, tmp_path):
         """shutdown_event 被 set 时子进程被终止，返回 success=False."""
-        import subprocess as _sp
-
         evt = threading.Event()
+        exited = threading.Event()
 
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(b"")
-        mock_proc.stderr = io.BytesIO(b"")
-        mock_proc.returncode = -15  # SIGTERM
+        mock_proc = _FakeProc(returncode=-15)  # SIGTERM
 
-        # 第一次 wait (poll loop) 超时，terminate 后第二次 wait 正常返回
-        mock_proc.wait.side_effect = [
-            _sp.TimeoutExpired("claude", 0.5),  # poll interval
-            None,  # after terminate
-        ]
+        # 子进程一直运行，直到收到 terminate
+        def fake_wait(timeout=None):
+            if not exited.wait(timeout):
+                raise subprocess.TimeoutExpired("claude", timeout)
+            return mock_proc.returncode
 
-        # 在 poll loop 期间 set shutdown event
-        evt.set()
+        def fake_terminate():
+            mock_proc.terminate_calls += 1
+            exited.set()
+
+        mock_proc.wait = fake_wait
+        mock_proc.poll = lambda: mock_proc.returncode if exited.is_set() else None
+        mock_proc.terminate = fake_terminate
+
+        threading.Timer(0.05, evt.set).start()
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = _run_claude(
@@ -567,15 +734,11 @@ class TestShutdownEvent:
 
         assert result.success is False
         assert "关闭信号" in result.error
-        mock_proc.terminate.assert_called_once()
+        assert mock_proc.terminate_calls == 1
 
     def test_no_shutdown_event_normal_exit(self, tmp_path):
         """shutdown_event=None 时正常执行不受影响."""
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(b"")
-        mock_proc.stderr = io.BytesIO(b"")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 0
+        mock_proc = _FakeProc()
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = _run_claude(
@@ -585,23 +748,50 @@ class TestShutdownEvent:
 
         assert result.success is True
 
+    def test_shutdown_after_exit_does_not_terminate(self, tmp_path):
+        """子进程正常结束后再收到关闭信号，不再终止进程."""
+        evt = threading.Event()
+        mock_proc = _FakeProc()
+
+        with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
+            result = _run_claude(
+                ["claude", "-p", "test"], tmp_path, timeout=30,
+                shutdown_event=evt,
+            )
+            evt.set()
+            time.sleep(0.05)
+
+        assert result.success is True
+        assert mock_proc.terminate_calls == 0
+
+    def test_single_watcher_shared_across_runs(self, tmp_path):
+        """多次执行共用一个监听线程；子进程结束后即注销，关闭信号到达后线程退出."""
+        evt = threading.Event()
+
+        with patch("vibe.manager.subprocess.Popen", side_effect=lambda *a, **kw: _FakeProc()):
+            for _ in range(5):
+                _run_claude(
+                    ["claude", "-p", "test"], tmp_path, timeout=600,
+                    shutdown_event=evt,
+                )
+
+        assert _live_procs[evt] == {}
+        watchers = [t for t in threading.enumerate() if t.name == "vibe-shutdown-watch"]
+        evt.set()
+        for t in watchers:
+            t.join(timeout=1)
+        assert not any(t.is_alive() for t in watchers)
+        assert evt not in _live_procs
+
 
 # ── resolve_conflicts ──────────────────────────────────────
 
 class TestResolveConflicts:
+    RESOLVED_STDOUT = _text_event_line("conflicts resolved")
+
     def test_success(self, tmp_path):
         """Claude 成功解决冲突 → success=True."""
-        event = {
-            "type": "assistant",
-            "message": {"content": [{"type": "text", "text": "conflicts resolved"}]},
-        }
-        stdout_bytes = json.dumps(event).encode() + b"\n"
-
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(stdout_bytes)
-        mock_proc.stderr = io.BytesIO(b"")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 0
+        mock_proc = _FakeProc(self.RESOLVED_STDOUT)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = resolve_conflicts(tmp_path, timeout=60)
@@ -610,11 +800,7 @@ class TestResolveConflicts:
 
     def test_failure(self, tmp_path):
         """Claude 解决失败 → success=False."""
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(b"")
-        mock_proc.stderr = io.BytesIO(b"error\n")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 1
+        mock_proc = _FakeProc(stderr=b"error\n", returncode=1)
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc):
             result = resolve_conflicts(tmp_path, timeout=60)
@@ -622,11 +808,7 @@ class TestResolveConflicts:
 
     def test_uses_skip_permissions(self, tmp_path):
         """命令包含 --dangerously-skip-permissions."""
-        mock_proc = MagicMock()
-        mock_proc.stdout = io.BytesIO(b"")
-        mock_proc.stderr = io.BytesIO(b"")
-        mock_proc.wait.return_value = None
-        mock_proc.returncode = 0
+        mock_proc = _FakeProc()
 
         with patch("vibe.manager.subprocess.Popen", return_value=mock_proc) as mock_popen:
             resolve_conflicts(tmp_path, timeout=60)
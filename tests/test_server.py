@@ -1,10 +1,14 @@
 """测试 server.py — FastAPI HTTP 路由（TestClient）."""
 
+import asyncio
+import logging
 from pathlib import Path
+from unittest.mock import MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 
+from vibe import server
 from vibe.approval import ApprovalStore
 from vibe.config import Config
 from vibe.history import ExecutionHistory
@@ -33,13 +37,14 @@ class TestGetTasks:
 
     def test_mixed(self, client: TestClient, workspace: Path):
         # pending
-        (workspace / "tasks" / "001_todo.md").write_text("todo", encoding="utf-8")
+        task_dir = workspace / "tasks"
+        (task_dir / "001_todo.md").write_text("todo", encoding="utf-8")
         # running
-        (workspace / "tasks" / "002_run.md.running.w0").write_text("run", encoding="utf-8")
+        (task_dir / "002_run.md.running.w0").write_text("run", encoding="utf-8")
         # done
-        (workspace / "tasks" / "done" / "20240101_120000_003_done.md").write_text("done", encoding="utf-8")
+        (task_dir / "done" / "20240101_120000_003_done.md").write_text("done", encoding="utf-8")
         # failed
-        (workspace / "tasks" / "failed" / "20240101_120000_004_fail.md").write_text("fail", encoding="utf-8")
+        (task_dir / "failed" / "20240101_120000_004_fail.md").write_text("fail", encoding="utf-8")
 
         resp = client.get("/api/tasks")
         data = resp.json()
@@ -52,6 +57,22 @@ class TestGetTasks:
         running = [t for t in data if t["status"] == "running"]
         assert running[0]["worker"] == "w0"
 
+    def test_scan_cached_until_change(self, client: TestClient, workspace: Path):
+        """目录未变化时复用缓存；编辑内容或新增 done 文件后重新扫描."""
+        task = workspace / "tasks" / "001_todo.md"
+        task.write_text("first\n", encoding="utf-8")
+        assert client.get("/api/tasks").json()[0]["description"] == "first"
+
+        with patch.object(Path, "read_text", side_effect=AssertionError("re-read")):
+            assert client.get("/api/tasks").json()[0]["description"] == "first"
+
+        task.write_text("second line\n", encoding="utf-8")
+        assert client.get("/api/tasks").json()[0]["description"] == "second line"
+
+        (workspace / "tasks" / "done" / "20240101_120000_002_x.md").write_text("d", encoding="utf-8")
+        names = {t["name"] for t in client.get("/api/tasks").json()}
+        assert "002_x" in names
+
 
 class TestPostTask:
     def test_add(self, client: TestClient, workspace: Path):
@@ -201,6 +222,11 @@ class TestGetConfig:
         assert "task_dir" in data
         assert "max_workers" in data
 
+    def test_reflects_runtime_changes(self, client: TestClient, config: Config):
+        assert client.get("/api/config").json()["max_workers"] == config.max_workers
+        config.max_workers = 7
+        assert client.get("/api/config").json()["max_workers"] == 7
+
 
 class TestTaskContent:
     def test_get_pending_content(self, client: TestClient, workspace: Path):
@@ -413,3 +439,65 @@ class TestApprovalEndpoints:
         """无 approval_store 时返回 404."""
         resp = client.post("/api/approvals/any/approve")
         assert resp.status_code == 404
+
+
+class TestSSELogHandler:
+    def test_wakeups_coalesced(self):
+        """一批日志只向事件循环提交一次唤醒，执行后才会再次提交."""
+        loop = MagicMock()
+        event = MagicMock()
+        record = logging.LogRecord("vibe", logging.INFO, __file__, 1, "msg", None, None)
+        handler = server._SSELogHandler()
+        ring = server._LogRing(10)
+        with (
+            patch.object(server, "_loop", loop),
+            patch.object(server, "_log_event", event),
+            patch.object(server, "_wake_pending", False),
+            patch.object(server, "_log_ring", ring),
+        ):
+            for _ in range(3):
+                handler.emit(record)
+            assert loop.call_soon_threadsafe.call_count == 1
+            # 缓冲中存放编码好的 SSE 事件
+            assert ring.since(0) == (3, [b"data: msg\n\n"] * 3)
+
+            # 事件循环执行唤醒后，新日志再次提交
+            loop.call_soon_threadsafe.call_args[0][0]()
+            event.set.assert_called_once()
+            handler.emit(record)
+            assert loop.call_soon_threadsafe.call_count == 2
+
+    def test_log_ring_since(self):
+        """按 seq 返回新增日志；被覆盖的旧日志从最早保留的一条开始."""
+        ring = server._LogRing(3)
+        assert ring.since(0) == (0, [])
+        for i in range(5):
+            ring.append(b"m%d" % i)
+        assert ring.since(0) == (5, [b"m2", b"m3", b"m4"])
+        assert ring.since(4) == (5, [b"m4"])
+        assert ring.since(5) == (5, [])
+
+    def test_stream_batches_burst(self):
+        """已有日志合并发送；唤醒后的突发日志合并成一个分块."""
+        async def scenario():
+            ring = server._LogRing(10)
+            ring.append(b"a")
+            ring.append(b"b")
+            event = asyncio.Event()
+            with (
+                patch.object(server, "_log_ring", ring),
+                patch.object(server, "_log_event", event),
+                patch.object(server, "_SSE_BATCH_DELAY", 0),
+            ):
+                gen = server._stream_log_events()
+                first = await gen.__anext__()
+                pending = asyncio.ensure_future(gen.__anext__())
+                await asyncio.sleep(0)
+                ring.append(b"c")
+                ring.append(b"d")
+                event.set()
+                second = await asyncio.wait_for(pending, timeout=1)
+                await gen.aclose()
+            return first, second
+
+        assert asyncio.run(scenario()) == (b"ab", b"cd")
@@ -1,8 +1,11 @@
 """测试 task.py — 全部用 tmp_path 做真实文件操作."""
 
+import os
 from pathlib import Path
 from unittest.mock import patch
 
+import pytest
+
 from vibe.config import Config
 from vibe.task import (
     TaskQueue,
@@ -20,22 +23,31 @@ from vibe.task import (
 # ── retry count 辅助函数 ─────────────────────────────────────
 
 class TestRetryCount:
-    def test_extract_none(self):
-        assert extract_retry_count("normal content") == 0
-
-    def test_extract(self):
-        assert extract_retry_count("<!-- RETRY: 3 -->\ncontent") == 3
-
-    def test_set_new(self):
-        result = _set_retry_count("content", 1)
-        assert result.startswith("<!-- RETRY: 1 -->")
-        assert "content" in result
-
-    def test_set_replace(self):
-        original = "<!-- RETRY: 1 -->\ncontent"
-        result = _set_retry_count(original, 2)
-        assert "<!-- RETRY: 2 -->" in result
-        assert "<!-- RETRY: 1 -->" not in result
+    @pytest.mark.parametrize(
+        ("content", "expected"),
+        [
+            ("normal content", 0),
+            ("<!-- RETRY: 3 -->\ncontent", 3),
+        ],
+    )
+    def test_extract(self, content: str, expected: int):
+        assert extract_retry_count(content) == expected
+
+    @pytest.mark.parametrize(
+        ("content", "count", "expected"),
+        [
+            # 无标记时加在开头
+            ("content", 1, "<!-- RETRY: 1 -->\ncontent"),
+            ("<!-- RETRY: 1 -->\ncontent", 2, "<!-- RETRY: 2 -->\ncontent"),
+            # 所有标记（含紧凑写法）都被替换
+            (
+                "head\n<!-- RETRY: 1 -->\nbody\n<!--RETRY:3-->\n", 4,
+                "head\n<!-- RETRY: 4 -->\nbody\n<!-- RETRY: 4 -->\n",
+            ),
+        ],
+    )
+    def test_set(self, content: str, count: int, expected: str):
+        assert _set_retry_count(content, count) == expected
 
 
 # ── extract_error_context ────────────────────────────────────
@@ -154,17 +166,61 @@ class TestClaimNext:
         assert task.path.name == "001_test.md.running.w0"
 
     def test_order(self, queue: TaskQueue, workspace: Path):
-        (workspace / "tasks" / "002_second.md").write_text("b", encoding="utf-8")
-        (workspace / "tasks" / "001_first.md").write_text("a", encoding="utf-8")
+        task_dir = workspace / "tasks"
+        (task_dir / "002_second.md").write_text("b", encoding="utf-8")
+        (task_dir / "001_first.md").write_text("a", encoding="utf-8")
 
         task = queue.claim_next("w0")
         assert task is not None
         assert task.name == "001_first"
 
+    def test_skips_running_and_hidden(self, queue: TaskQueue, workspace: Path):
+        task_dir = workspace / "tasks"
+        (task_dir / "001_a.md.running.w9").write_text("a", encoding="utf-8")
+        (task_dir / ".000_hidden.md").write_text("h", encoding="utf-8")
+        (task_dir / "002_b.md").write_text("b", encoding="utf-8")
+
+        task = queue.claim_next("w0")
+        assert task is not None
+        assert task.name == "002_b"
+        assert queue.claim_next("w1") is None
+
+    def test_skips_md_directory(self, queue: TaskQueue, workspace: Path):
+        task_dir = workspace / "tasks"
+        (task_dir / "001_dir.md").mkdir()
+        (task_dir / "002_b.md").write_text("b", encoding="utf-8")
+
+        task = queue.claim_next("w0")
+        assert task is not None
+        assert task.name == "002_b"
+
+    def test_initial_pending_used_once(self, config: Config, workspace: Path):
+        """首次认领复用预扫描列表，之后回到实时扫描."""
+        task_dir = workspace / "tasks"
+        (task_dir / "002_b.md").write_text("b", encoding="utf-8")
+        (task_dir / "001_a.md").write_text("a", encoding="utf-8")
+        q = TaskQueue(config, workspace, initial_pending=list(task_dir.glob("*.md")))
+        # 预扫描之后新增的任务只会在后续实时扫描中出现
+        (task_dir / "000_late.md").write_text("late", encoding="utf-8")
+
+        first = q.claim_next("w0")
+        assert first is not None and first.name == "001_a"
+
+        second = q.claim_next("w1")
+        assert second is not None and second.name == "000_late"
+
+    def test_initial_pending_stale_entry_skipped(self, config: Config, workspace: Path):
+        task_dir = workspace / "tasks"
+        gone = task_dir / "001_gone.md"
+        (task_dir / "002_b.md").write_text("b", encoding="utf-8")
+        q = TaskQueue(config, workspace, initial_pending=[gone, task_dir / "002_b.md"])
+        task = q.claim_next("w0")
+        assert task is not None and task.name == "002_b"
+
 
 class TestComplete:
-    def test_moves_to_done(self, queue: TaskQueue, workspace: Path):
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+    def test_moves_to_done(self, queue: TaskQueue, workspace: Path, make_task):
+        make_task()
         task = queue.claim_next("w0")
         queue.complete(task)
 
@@ -177,8 +233,8 @@ class TestComplete:
 
 
 class TestFail:
-    def test_retry(self, queue: TaskQueue, workspace: Path):
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+    def test_retry(self, queue: TaskQueue, workspace: Path, make_task):
+        make_task()
         task = queue.claim_next("w0")
         queue.fail(task, "some error")
 
@@ -210,9 +266,9 @@ class TestFailAtomicWrite:
     """测试 fail() 的原子写入: os.replace 失败时 .running 文件不丢失."""
 
     def test_retry_atomic_preserves_running_on_replace_failure(
-        self, queue: TaskQueue, workspace: Path,
+        self, queue: TaskQueue, workspace: Path, make_task,
     ):
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
         task = queue.claim_next("w0")
         assert task is not None
 
@@ -249,8 +305,9 @@ class TestFailAtomicWrite:
 class TestFileSizeLimit:
     def test_oversized_file_skipped(self, queue: TaskQueue, workspace: Path):
         task_file = workspace / "tasks" / "001_big.md"
-        # 写入超过 1MB 的内容
-        task_file.write_text("x" * (_MAX_TASK_FILE_SIZE + 1), encoding="utf-8")
+        # 稀疏文件：大小超过 1MB，但不实际写入内容
+        task_file.touch()
+        os.truncate(task_file, _MAX_TASK_FILE_SIZE + 1)
         task = queue.claim_next("w0")
         assert task is None
 
@@ -298,6 +355,20 @@ class TestRetryFailed:
         assert (task_dir / "001_a.md").exists()
         assert (task_dir / "002_b.md").exists()
 
+    def test_retry_skips_oversized(self, workspace: Path):
+        task_dir = workspace / "tasks"
+        fail_dir = workspace / "tasks" / "failed"
+        big = fail_dir / "20240101_120000_000000_001_big.md"
+        # 稀疏文件：大小超过上限，但不实际写入内容
+        big.touch()
+        os.truncate(big, _MAX_TASK_FILE_SIZE + 1)
+        (fail_dir / "20240101_120001_000000_002_ok.md").write_text("ok\n", encoding="utf-8")
+
+        retried = TaskQueue.retry_failed(task_dir, fail_dir)
+        assert retried == ["002_ok.md"]
+        assert big.exists()
+        assert not (task_dir / "001_big.md").exists()
+
     def test_retry_empty(self, workspace: Path):
         task_dir = workspace / "tasks"
         fail_dir = workspace / "tasks" / "failed"
@@ -330,9 +401,9 @@ class TestRelease:
         assert restored.exists()
         assert restored.read_text(encoding="utf-8") == "task content"
 
-    def test_release_can_be_reclaimed(self, queue: TaskQueue, workspace: Path):
+    def test_release_can_be_reclaimed(self, queue: TaskQueue, workspace: Path, make_task):
         """release 后任务可被再次 claim."""
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
         task = queue.claim_next("w0")
         queue.release(task)
 
@@ -458,6 +529,14 @@ class TestNextTaskNumber:
         (fail_dir / "20240101_120000_000000_003_fail.md").write_text("x", encoding="utf-8")
         assert next_task_number(task_dir, done_dir, fail_dir) == 6
 
+    def test_ignores_non_task_entries(self, workspace: Path):
+        """非任务文件不参与编号；done/failed 目录不存在时跳过."""
+        task_dir = workspace / "tasks"
+        (task_dir / "099_notes.txt").write_text("x", encoding="utf-8")
+        (task_dir / "002_task.md").write_text("x", encoding="utf-8")
+        missing = workspace / "missing"
+        assert next_task_number(task_dir, missing, missing) == 3
+
 
 # ── _make_slug ────────────────────────────────────────────────
 
@@ -488,10 +567,11 @@ class TestMakeSlug:
 class TestClaimNextDependencies:
     def test_skips_blocked_task(self, queue: TaskQueue, workspace: Path):
         """依赖未满足的任务被跳过."""
-        (workspace / "tasks" / "001_first.md").write_text(
+        task_dir = workspace / "tasks"
+        (task_dir / "001_first.md").write_text(
             "<!-- DEPENDS: 999 -->\ntask 1", encoding="utf-8",
         )
-        (workspace / "tasks" / "002_second.md").write_text("task 2", encoding="utf-8")
+        (task_dir / "002_second.md").write_text("task 2", encoding="utf-8")
 
         task = queue.claim_next("w0")
         assert task is not None
@@ -513,19 +593,20 @@ class TestClaimNextDependencies:
 
     def test_all_blocked_returns_none(self, queue: TaskQueue, workspace: Path):
         """所有任务都被依赖阻塞时返回 None."""
-        (workspace / "tasks" / "001_a.md").write_text(
+        task_dir = workspace / "tasks"
+        (task_dir / "001_a.md").write_text(
             "<!-- DEPENDS: 999 -->\ntask a", encoding="utf-8",
         )
-        (workspace / "tasks" / "002_b.md").write_text(
+        (task_dir / "002_b.md").write_text(
             "<!-- DEPENDS: 998 -->\ntask b", encoding="utf-8",
         )
 
         task = queue.claim_next("w0")
         assert task is None
 
-    def test_no_deps_field_when_empty(self, queue: TaskQueue, workspace: Path):
+    def test_no_deps_field_when_empty(self, queue: TaskQueue, workspace: Path, make_task):
         """无依赖的任务 depends_on 为 None."""
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         task = queue.claim_next("w0")
         assert task is not None
@@ -1,10 +1,12 @@
 """测试 worker.py — mock manager + queue."""
 
+import queue
 import threading
+from collections.abc import Callable
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
-from vibe.approval import ApprovalStore
+from vibe.approval import ApprovalStore, PendingApproval
 from vibe.config import Config
 from vibe.manager import TaskResult
 from vibe.task import Task, TaskQueue
@@ -12,6 +14,7 @@ from vibe.worker import (
     PROMPT_PREFIX, PROMPT_SUFFIX, _docker_kwargs, _format_tool_detail,
     _make_verbose_callback, build_prompt, worker_loop,
 )
+from vibe.worker import manager as worker_manager
 
 
 class TestBuildPrompt:
@@ -85,15 +88,16 @@ class TestWorkerLoop:
 
     def test_processes_all(self, config: Config, workspace: Path, queue: TaskQueue):
         """两个任务 → 都被处理."""
-        (workspace / "tasks" / "001_a.md").write_text("task a", encoding="utf-8")
-        (workspace / "tasks" / "002_b.md").write_text("task b", encoding="utf-8")
+        task_dir = workspace / "tasks"
+        (task_dir / "001_a.md").write_text("task a", encoding="utf-8")
+        (task_dir / "002_b.md").write_text("task b", encoding="utf-8")
 
         mock_result = TaskResult(success=True, output="ok", files_changed=[], duration_seconds=1.0)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result):
+        with patch.object(worker_manager, "run_task", return_value=mock_result):
             worker_loop("w0", config, queue)
 
         # 两个任务都应完成
-        done_files = list((workspace / "tasks" / "done").glob("*.md"))
+        done_files = list((task_dir / "done").glob("*.md"))
         assert len(done_files) == 2
 
 
@@ -103,7 +107,7 @@ class TestExecuteTask:
         (workspace / "tasks" / "001_test.md").write_text("content", encoding="utf-8")
 
         mock_result = TaskResult(success=True, output="done", files_changed=[], duration_seconds=0.5)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result):
+        with patch.object(worker_manager, "run_task", return_value=mock_result):
             worker_loop("w0", config, queue)
 
         done_files = list((workspace / "tasks" / "done").glob("*.md"))
@@ -117,7 +121,7 @@ class TestExecuteTask:
         (workspace / "tasks" / "001_test.md").write_text("content", encoding="utf-8")
 
         mock_result = TaskResult(success=False, error="broke", files_changed=[], duration_seconds=0.5)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result) as mock_run:
+        with patch.object(worker_manager, "run_task", return_value=mock_result) as mock_run:
             worker_loop("w0", cfg, q)
 
         # worker loops: claim→fail→requeue (x3), then exhausted → failed/
@@ -132,7 +136,7 @@ class TestExecuteTask:
         (workspace / "tasks" / "001_test.md").write_text("plan task", encoding="utf-8")
 
         mock_result = TaskResult(success=True, output="planned", files_changed=[], duration_seconds=1.0)
-        with patch("vibe.worker.manager.run_plan", return_value=mock_result) as mock_plan:
+        with patch.object(worker_manager, "run_plan", return_value=mock_result) as mock_plan:
             worker_loop("w0", cfg, q)
 
         mock_plan.assert_called_once()
@@ -157,7 +161,7 @@ class TestDiagnosticsInjection:
                 {"tool_use_id": "tc1", "is_error": True, "content": "FAILED tests/test_x.py::test_y"},
             ],
         )
-        with patch("vibe.worker.manager.run_task", return_value=mock_result):
+        with patch.object(worker_manager, "run_task", return_value=mock_result):
             worker_loop("w0", cfg, q)
 
         # 任务应该到 failed/ 中（max_retries=1, 第一次失败就耗尽）
@@ -179,7 +183,7 @@ class TestDiagnosticsInjection:
             return_code=1,
             duration_seconds=5.0,
         )
-        with patch("vibe.worker.manager.run_task", return_value=mock_result):
+        with patch.object(worker_manager, "run_task", return_value=mock_result):
             worker_loop("w0", cfg, q)
 
         failed_files = list((workspace / "tasks" / "failed").glob("*.md"))
@@ -188,20 +192,39 @@ class TestDiagnosticsInjection:
         assert "Diagnostics" not in content
 
 
+class _NotifyingStore(ApprovalStore):
+    """submit 时把审批放入 submitted 队列，测试阻塞等待而不必轮询 list_pending.
+
+    提供 decide 时在提交后立即对该审批做出决策（如 ApprovalStore.reject）。
+    """
+
+    def __init__(self, decide: Callable[[ApprovalStore, str], object] | None = None) -> None:
+        super().__init__()
+        self.submitted: queue.Queue[PendingApproval] = queue.Queue()
+        self._decide = decide
+
+    def submit(self, task_name: str, worker_id: str, plan_text: str) -> PendingApproval:
+        item = super().submit(task_name, worker_id, plan_text)
+        self.submitted.put(item)
+        if self._decide is not None:
+            self._decide(self, item.approval_id)
+        return item
+
+
 class TestApprovalFlow:
     def test_approval_approved(self, workspace: Path):
         """store.approve → execute_plan 被调用 → 任务完成."""
         cfg = Config(workspace=str(workspace), plan_mode=True, plan_auto_approve=False)
         q = TaskQueue(cfg, workspace)
-        store = ApprovalStore()
+        store = _NotifyingStore()
         (workspace / "tasks" / "001_test.md").write_text("task content", encoding="utf-8")
 
         plan_result = TaskResult(success=True, output="the plan", duration_seconds=0.5)
         exec_result = TaskResult(success=True, output="[计划]\nthe plan\n\n[执行结果]\nexecuted", duration_seconds=1.0)
 
         with (
-            patch("vibe.worker.manager.generate_plan", return_value=plan_result),
-            patch("vibe.worker.manager.execute_plan", return_value=exec_result) as mock_exec,
+            patch.object(worker_manager, "generate_plan", return_value=plan_result),
+            patch.object(worker_manager, "execute_plan", return_value=exec_result) as mock_exec,
         ):
             # 在另一线程中运行 worker，因为它会阻塞
             def run_worker():
@@ -211,15 +234,9 @@ class TestApprovalFlow:
             t.start()
 
             # 等待审批出现
-            import time
-            for _ in range(50):
-                if store.list_pending():
-                    break
-                time.sleep(0.05)
-
-            pending = store.list_pending()
-            assert len(pending) == 1
-            store.approve(pending[0].approval_id)
+            approval = store.submitted.get(timeout=5)
+            assert store.list_pending() == [approval]
+            store.approve(approval.approval_id)
 
             t.join(timeout=5)
             assert not t.is_alive()
@@ -232,33 +249,46 @@ class TestApprovalFlow:
         """store.reject → 任务失败."""
         cfg = Config(workspace=str(workspace), plan_mode=True, plan_auto_approve=False, max_retries=1)
         q = TaskQueue(cfg, workspace)
-        store = ApprovalStore()
+        # 每次循环都会 re-claim 并 re-generate plan，每次提交都立即拒绝
+        store = _NotifyingStore(ApprovalStore.reject)
         (workspace / "tasks" / "001_test.md").write_text("task content", encoding="utf-8")
 
         plan_result = TaskResult(success=True, output="the plan", duration_seconds=0.5)
 
-        with patch("vibe.worker.manager.generate_plan", return_value=plan_result):
+        with patch.object(worker_manager, "generate_plan", return_value=plan_result):
             def run_worker():
                 worker_loop("w0", cfg, q, approval_store=store)
 
             t = threading.Thread(target=run_worker)
             t.start()
+            t.join(timeout=5)
+            assert not t.is_alive()
+
+        failed_files = list((workspace / "tasks" / "failed").glob("*.md"))
+        assert len(failed_files) == 1
+
+    def test_approval_cancelled(self, workspace: Path):
+        """store.remove（取消）→ worker 立即返回失败，不执行计划."""
+        cfg = Config(workspace=str(workspace), plan_mode=True, plan_auto_approve=False, max_retries=1)
+        q = TaskQueue(cfg, workspace)
+        store = _NotifyingStore(ApprovalStore.remove)
+        (workspace / "tasks" / "001_test.md").write_text("task content", encoding="utf-8")
 
-            # 每次循环都会 re-claim 并 re-generate plan，需要 reject 每次
-            import time
-            for _ in range(50):
-                pending = store.list_pending()
-                if pending:
-                    store.reject(pending[0].approval_id)
-                if not t.is_alive():
-                    break
-                time.sleep(0.05)
+        plan_result = TaskResult(success=True, output="the plan", duration_seconds=0.5)
 
+        with (
+            patch.object(worker_manager, "generate_plan", return_value=plan_result),
+            patch.object(worker_manager, "execute_plan") as mock_exec,
+        ):
+            t = threading.Thread(target=worker_loop, args=("w0", cfg, q), kwargs={"approval_store": store})
+            t.start()
             t.join(timeout=5)
             assert not t.is_alive()
 
+        mock_exec.assert_not_called()
         failed_files = list((workspace / "tasks" / "failed").glob("*.md"))
         assert len(failed_files) == 1
+        assert "审批已取消" in failed_files[0].read_text(encoding="utf-8")
 
     def test_plan_mode_auto_approve(self, workspace: Path):
         """plan_auto_approve=True → 走 run_plan 不经过 store."""
@@ -268,7 +298,7 @@ class TestApprovalFlow:
         (workspace / "tasks" / "001_test.md").write_text("task content", encoding="utf-8")
 
         mock_result = TaskResult(success=True, output="planned", files_changed=[], duration_seconds=1.0)
-        with patch("vibe.worker.manager.run_plan", return_value=mock_result) as mock_plan:
+        with patch.object(worker_manager, "run_plan", return_value=mock_result) as mock_plan:
             worker_loop("w0", cfg, q, approval_store=store)
 
         mock_plan.assert_called_once()
@@ -290,7 +320,7 @@ class TestInterruptedRelease:
             shutdown_event.set()
             return mock_result
 
-        with patch("vibe.worker.manager.run_task", side_effect=run_task_and_shutdown):
+        with patch.object(worker_manager, "run_task", side_effect=run_task_and_shutdown):
             worker_loop("w0", config, queue)
 
         # 清理 shutdown_event 供其他测试使用
@@ -319,7 +349,7 @@ class TestInterruptedRelease:
             shutdown_event.set()
             return mock_result
 
-        with patch("vibe.worker.manager.run_task", side_effect=run_task_and_shutdown):
+        with patch.object(worker_manager, "run_task", side_effect=run_task_and_shutdown):
             worker_loop("w0", cfg, q)
 
         shutdown_event.clear()
@@ -351,14 +381,14 @@ class TestDockerKwargs:
             "docker_extra_args": "--net=none",
         }
 
-    def test_docker_kwargs_passed_to_run_task(self, workspace: Path):
+    def test_docker_kwargs_passed_to_run_task(self, workspace: Path, make_task):
         """Docker kwargs 被正确传递到 manager.run_task."""
         cfg = Config(workspace=str(workspace), use_docker=True, docker_image="test-img")
         q = TaskQueue(cfg, workspace)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         mock_result = TaskResult(success=True, output="ok", duration_seconds=0.5)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result) as mock_run:
+        with patch.object(worker_manager, "run_task", return_value=mock_result) as mock_run:
             worker_loop("w0", cfg, q)
 
         mock_run.assert_called_once()
@@ -367,17 +397,17 @@ class TestDockerKwargs:
         assert kwargs["docker_image"] == "test-img"
         assert kwargs["docker_extra_args"] == ""
 
-    def test_docker_kwargs_passed_to_run_plan(self, workspace: Path):
+    def test_docker_kwargs_passed_to_run_plan(self, workspace: Path, make_task):
         """Docker kwargs 被正确传递到 manager.run_plan."""
         cfg = Config(
             workspace=str(workspace), plan_mode=True,
             use_docker=True, docker_image="plan-img",
         )
         q = TaskQueue(cfg, workspace)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         mock_result = TaskResult(success=True, output="ok", duration_seconds=0.5)
-        with patch("vibe.worker.manager.run_plan", return_value=mock_result) as mock_plan:
+        with patch.object(worker_manager, "run_plan", return_value=mock_result) as mock_plan:
             worker_loop("w0", cfg, q)
 
         mock_plan.assert_called_once()
@@ -455,6 +485,21 @@ class TestMakeVerboseCallback:
             cb("not json at all")
         assert len(caplog.records) == 0
 
+    def test_other_events_skip_decode(self, caplog):
+        """system 等无关事件不做 JSON 解析."""
+        import json
+        import logging
+
+        cb = _make_verbose_callback("w0")
+        with (
+            caplog.at_level(logging.INFO, logger="vibe.worker"),
+            patch("vibe.worker.json.loads") as mock_loads,
+        ):
+            cb(json.dumps({"type": "system", "subtype": "init"}))
+            cb("[1, 2]")
+        mock_loads.assert_not_called()
+        assert len(caplog.records) == 0
+
     def test_empty_line_ignored(self, caplog):
         import logging
 
@@ -474,7 +519,7 @@ class TestOnTaskSuccess:
 
         mock_result = TaskResult(success=True, output="done", files_changed=[], duration_seconds=0.5)
         callback = MagicMock(return_value=True)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result):
+        with patch.object(worker_manager, "run_task", return_value=mock_result):
             worker_loop("w0", config, queue, on_task_success=callback)
 
         callback.assert_called_once_with("001_test", "w0")
@@ -489,7 +534,7 @@ class TestOnTaskSuccess:
 
         mock_result = TaskResult(success=True, output="done", files_changed=[], duration_seconds=0.5)
         callback = MagicMock(return_value=False)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result):
+        with patch.object(worker_manager, "run_task", return_value=mock_result):
             worker_loop("w0", cfg, q, on_task_success=callback)
 
         # 2 retries: call 1 → fail(0→1) → requeue, call 2 → fail(1→2≥2) → exhausted
@@ -507,7 +552,7 @@ class TestOnTaskSuccess:
 
         mock_result = TaskResult(success=True, output="done", files_changed=[], duration_seconds=0.5)
         callback = MagicMock(side_effect=RuntimeError("boom"))
-        with patch("vibe.worker.manager.run_task", return_value=mock_result):
+        with patch.object(worker_manager, "run_task", return_value=mock_result):
             worker_loop("w0", cfg, q, on_task_success=callback)
 
         failed_files = list((workspace / "tasks" / "failed").glob("*.md"))
@@ -518,7 +563,7 @@ class TestOnTaskSuccess:
         (workspace / "tasks" / "001_test.md").write_text("content", encoding="utf-8")
 
         mock_result = TaskResult(success=True, output="done", files_changed=[], duration_seconds=0.5)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result):
+        with patch.object(worker_manager, "run_task", return_value=mock_result):
             worker_loop("w0", config, queue)  # no on_task_success
 
         done_files = list((workspace / "tasks" / "done").glob("*.md"))
@@ -545,7 +590,7 @@ class TestOnBeforeTask:
             call_order.append("run_task")
             return mock_result
 
-        with patch("vibe.worker.manager.run_task", side_effect=tracking_run_task):
+        with patch.object(worker_manager, "run_task", side_effect=tracking_run_task):
             worker_loop("w0", config, queue, on_before_task=before_cb)
 
         assert call_order == ["before", "run_task"]
@@ -558,7 +603,7 @@ class TestOnBeforeTask:
             raise RuntimeError("sync failed")
 
         mock_result = TaskResult(success=True, output="done", files_changed=[], duration_seconds=0.5)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result) as mock_run:
+        with patch.object(worker_manager, "run_task", return_value=mock_result) as mock_run:
             worker_loop("w0", config, queue, on_before_task=bad_cb)
 
         # 即使回调异常，任务仍然执行
@@ -568,14 +613,14 @@ class TestOnBeforeTask:
 
 
 class TestVerboseWiring:
-    def test_verbose_true_passes_on_output(self, workspace: Path):
+    def test_verbose_true_passes_on_output(self, workspace: Path, make_task):
         """verbose=True → manager.run_task 收到非 None 的 on_output."""
         cfg = Config(workspace=str(workspace), verbose=True)
         q = TaskQueue(cfg, workspace)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         mock_result = TaskResult(success=True, output="ok", duration_seconds=0.5)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result) as mock_run:
+        with patch.object(worker_manager, "run_task", return_value=mock_result) as mock_run:
             worker_loop("w0", cfg, q)
 
         mock_run.assert_called_once()
@@ -583,28 +628,28 @@ class TestVerboseWiring:
         assert kwargs["on_output"] is not None
         assert callable(kwargs["on_output"])
 
-    def test_verbose_false_passes_none(self, workspace: Path):
+    def test_verbose_false_passes_none(self, workspace: Path, make_task):
         """verbose=False → manager.run_task 收到 on_output=None."""
         cfg = Config(workspace=str(workspace), verbose=False)
         q = TaskQueue(cfg, workspace)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         mock_result = TaskResult(success=True, output="ok", duration_seconds=0.5)
-        with patch("vibe.worker.manager.run_task", return_value=mock_result) as mock_run:
+        with patch.object(worker_manager, "run_task", return_value=mock_result) as mock_run:
             worker_loop("w0", cfg, q)
 
         mock_run.assert_called_once()
         _, kwargs = mock_run.call_args
         assert kwargs["on_output"] is None
 
-    def test_verbose_plan_mode_passes_on_output(self, workspace: Path):
+    def test_verbose_plan_mode_passes_on_output(self, workspace: Path, make_task):
         """verbose + plan_mode → manager.run_plan 收到非 None 的 on_output."""
         cfg = Config(workspace=str(workspace), verbose=True, plan_mode=True)
         q = TaskQueue(cfg, workspace)
-        (workspace / "tasks" / "001_test.md").write_text("task", encoding="utf-8")
+        make_task()
 
         mock_result = TaskResult(success=True, output="ok", duration_seconds=0.5)
-        with patch("vibe.worker.manager.run_plan", return_value=mock_result) as mock_plan:
+        with patch.object(worker_manager, "run_plan", return_value=mock_result) as mock_plan:
             worker_loop("w0", cfg, q)
 
         mock_plan.assert_called_once()
@@ -3,11 +3,12 @@
 import subprocess
 import threading
 from pathlib import Path
-from unittest.mock import patch, call
+from unittest.mock import MagicMock, patch
+
+import pytest
 
 from vibe.worktree import (
     MergeCoordinator,
-    MergeResult,
     MergeStatus,
     _parse_conflict_files,
     cleanup_stale_worktrees,
@@ -18,6 +19,10 @@ from vibe.worktree import (
 )
 
 
+# _run_git 全部被 mock，这些测试不访问文件系统，无需 tmp_path
+_REPO = Path("/nonexistent/repo")
+
+
 def _cp(stdout="", stderr="", returncode=0):
     """创建 CompletedProcess 快捷方法."""
     return subprocess.CompletedProcess(
@@ -25,88 +30,97 @@ def _cp(stdout="", stderr="", returncode=0):
     )
 
 
+# 最常用的成功 / 失败结果，只读共享
+_OK = _cp()
+_FAIL = _cp(returncode=1, stderr="error")
+
+
+@pytest.fixture
+def mock_run_git(monkeypatch: pytest.MonkeyPatch) -> MagicMock:
+    """替换 vibe.worktree._run_git；测试按需设置 return_value / side_effect."""
+    mock = MagicMock()
+    monkeypatch.setattr("vibe.worktree._run_git", mock)
+    return mock
+
+
 class TestIsGitRepo:
-    def test_true(self, tmp_path: Path):
-        with patch("vibe.worktree._run_git", return_value=_cp(stdout="true")):
-            assert is_git_repo(tmp_path) is True
+    def test_true(self, mock_run_git: MagicMock):
+        mock_run_git.return_value = _cp(stdout="true")
+        assert is_git_repo(_REPO) is True
 
-    def test_false(self, tmp_path: Path):
-        with patch("vibe.worktree._run_git", return_value=_cp(returncode=1)):
-            assert is_git_repo(tmp_path) is False
+    def test_false(self, mock_run_git: MagicMock):
+        mock_run_git.return_value = _cp(returncode=1)
+        assert is_git_repo(_REPO) is False
 
-    def test_no_git(self, tmp_path: Path):
-        with patch("vibe.worktree._run_git", side_effect=FileNotFoundError):
-            assert is_git_repo(tmp_path) is False
+    def test_no_git(self, mock_run_git: MagicMock):
+        mock_run_git.side_effect = FileNotFoundError
+        assert is_git_repo(_REPO) is False
 
 
 class TestCreateWorktree:
-    def test_success(self, tmp_path: Path):
-        with patch("vibe.worktree._run_git", return_value=_cp()):
-            path = create_worktree(tmp_path, "w0")
+    def test_success(self, mock_run_git: MagicMock, tmp_path: Path):
+        mock_run_git.return_value = _OK
+        path = create_worktree(tmp_path, "w0")
         assert "vibe-w0-" in str(path)
 
-    def test_failure(self, tmp_path: Path):
-        with patch("vibe.worktree._run_git", return_value=_cp(returncode=1, stderr="error")):
-            try:
-                create_worktree(tmp_path, "w0")
-                assert False, "Should raise RuntimeError"
-            except RuntimeError as e:
-                assert "失败" in str(e)
+    def test_failure(self, mock_run_git: MagicMock, tmp_path: Path):
+        mock_run_git.return_value = _FAIL
+        with pytest.raises(RuntimeError, match="失败"):
+            create_worktree(tmp_path, "w0")
 
 
 class TestRemoveWorktree:
-    def test_calls_correct_command(self, tmp_path: Path):
+    def test_calls_correct_command(self, mock_run_git: MagicMock):
         wt = Path("/tmp/vibe-w0-12345")
-        with patch("vibe.worktree._run_git", return_value=_cp()) as mock_git:
-            remove_worktree(tmp_path, wt)
-        mock_git.assert_called_once()
-        args = mock_git.call_args[0][0]
-        assert "worktree" in args
-        assert "remove" in args
+        mock_run_git.return_value = _OK
+        remove_worktree(_REPO, wt)
+        mock_run_git.assert_called_once_with(["worktree", "remove", str(wt), "--force"], _REPO)
 
 
 class TestCommitAndMerge:
-    def test_no_changes(self, tmp_path: Path):
-        """status 为空 → 返回 True，不 commit."""
-        with patch("vibe.worktree._run_git", return_value=_cp(stdout="")):
-            result = commit_and_merge(tmp_path, Path("/tmp/wt"), "msg")
-        assert result is True
-
-    def test_success(self, tmp_path: Path):
-        """status→add→commit→branch→merge→branch -d 全链路."""
-        responses = [
-            _cp(stdout="M file.py"),     # status --porcelain
-            _cp(),                        # add -A
-            _cp(),                        # commit
-            _cp(stdout="vibe/w0-123"),   # rev-parse branch
-            _cp(),                        # merge
-            _cp(),                        # branch -d
-        ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = commit_and_merge(tmp_path, Path("/tmp/wt"), "msg")
-        assert result is True
-
-    def test_merge_conflict(self, tmp_path: Path):
-        """merge 失败 → abort + 返回 False."""
-        responses = [
-            _cp(stdout="M file.py"),     # status
-            _cp(),                        # add
-            _cp(),                        # commit
-            _cp(stdout="vibe/w0-123"),   # branch
-            _cp(returncode=1, stderr="conflict"),  # merge fails
-            _cp(),                        # merge --abort
-        ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = commit_and_merge(tmp_path, Path("/tmp/wt"), "msg")
-        assert result is False
+    @pytest.mark.parametrize(
+        ("responses", "expected"),
+        [
+            # status 为空 → 返回 True，不 commit
+            ([_OK], True),
+            # status→add→commit→branch→merge→branch -d 全链路
+            (
+                [
+                    _cp(stdout="M file.py"),     # status --porcelain
+                    _OK,                          # add -A
+                    _OK,                          # commit
+                    _cp(stdout="vibe/w0-123"),   # rev-parse branch
+                    _OK,                          # merge
+                    _OK,                          # branch -d
+                ],
+                True,
+            ),
+            # merge 失败 → abort + 返回 False
+            (
+                [
+                    _cp(stdout="M file.py"),     # status
+                    _OK,                          # add
+                    _OK,                          # commit
+                    _cp(stdout="vibe/w0-123"),   # branch
+                    _cp(returncode=1, stderr="conflict"),  # merge fails
+                    _OK,                          # merge --abort
+                ],
+                False,
+            ),
+        ],
+        ids=["no_changes", "success", "merge_conflict"],
+    )
+    def test_commit_and_merge(self, mock_run_git: MagicMock, responses, expected: bool):
+        mock_run_git.side_effect = responses
+        result = commit_and_merge(_REPO, Path("/tmp/wt"), "msg")
+        assert result is expected
 
 
 class TestCleanupStale:
-    def test_calls_prune(self, tmp_path: Path):
-        with patch("vibe.worktree._run_git", return_value=_cp()) as mock_git:
-            cleanup_stale_worktrees(tmp_path)
-        args = mock_git.call_args[0][0]
-        assert args == ["worktree", "prune"]
+    def test_calls_prune(self, mock_run_git: MagicMock):
+        mock_run_git.return_value = _OK
+        cleanup_stale_worktrees(_REPO)
+        mock_run_git.assert_called_once_with(["worktree", "prune"], _REPO)
 
 
 class TestParseConflictFiles:
@@ -126,157 +140,158 @@ class TestParseConflictFiles:
 
 
 class TestMergeCoordinator:
-    def test_merge_no_changes(self, tmp_path: Path):
+    def test_merge_no_changes(self, mock_run_git: MagicMock):
         """status + log 都为空 → NO_CHANGES（Phase 1 终止，不进 Phase 2）."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         responses = [
-            _cp(stdout=""),   # status --porcelain
-            _cp(stdout=""),   # log main..HEAD --oneline
+            _OK,              # status --porcelain
+            _OK,              # log main..HEAD --oneline
         ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
+        mock_run_git.side_effect = responses
+        result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.NO_CHANGES
 
-    def test_merge_committed_changes(self, tmp_path: Path):
+    def test_merge_committed_changes(self, mock_run_git: MagicMock):
         """Claude 已 commit → Phase1: rebase → Phase2: re-rebase + ff-merge."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         responses = [
-            _cp(stdout=""),                     # Phase1: status --porcelain (clean)
+            _OK,                                # Phase1: status --porcelain (clean)
             _cp(stdout="abc1234 some change"),  # Phase1: log main..HEAD (has commits)
-            _cp(),                              # Phase1: rebase main
-            _cp(),                              # Phase2: rebase main (re-rebase)
+            _OK,                                # Phase1: rebase main
+            _OK,                                # Phase2: rebase main (re-rebase)
             _cp(stdout="vibe/w0-123"),          # Phase2: rev-parse --abbrev-ref HEAD
-            _cp(),                              # Phase2: merge --ff-only
+            _OK,                                # Phase2: merge --ff-only
         ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
+        mock_run_git.side_effect = responses
+        result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.SUCCESS
 
-    def test_merge_uncommitted_changes(self, tmp_path: Path):
+    def test_merge_uncommitted_changes(self, mock_run_git: MagicMock):
         """有未提交 → Phase1: add/commit/rebase → Phase2: re-rebase/ff-merge."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         responses = [
             _cp(stdout="M file.py"),            # Phase1: status --porcelain
-            _cp(stdout=""),                     # Phase1: log main..HEAD (no prior)
-            _cp(),                              # Phase1: add -A
-            _cp(),                              # Phase1: commit
-            _cp(),                              # Phase1: rebase main
-            _cp(),                              # Phase2: rebase main (re-rebase)
+            _OK,                                # Phase1: log main..HEAD (no prior)
+            _OK,                                # Phase1: add -A
+            _OK,                                # Phase1: commit
+            _OK,                                # Phase1: rebase main
+            _OK,                                # Phase2: rebase main (re-rebase)
             _cp(stdout="vibe/w0-123"),          # Phase2: rev-parse --abbrev-ref HEAD
-            _cp(),                              # Phase2: merge --ff-only
+            _OK,                                # Phase2: merge --ff-only
         ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
+        mock_run_git.side_effect = responses
+        result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.SUCCESS
 
-    def test_merge_conflict(self, tmp_path: Path):
+    def test_merge_conflict(self, mock_run_git: MagicMock):
         """Phase1 rebase 失败（resolve_conflicts=False）→ abort → CONFLICT."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         conflict_stderr = "CONFLICT (content): Merge conflict in src/app.py\nerror: could not apply abc"
         responses = [
             _cp(stdout="M file.py"),            # status
-            _cp(stdout=""),                     # log
-            _cp(),                              # add -A
-            _cp(),                              # commit
+            _OK,                                # log
+            _OK,                                # add -A
+            _OK,                                # commit
             _cp(returncode=1, stderr=conflict_stderr),  # rebase fails
-            _cp(),                              # rebase --abort
+            _OK,                                # rebase --abort
         ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
+        mock_run_git.side_effect = responses
+        result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.CONFLICT
         assert result.conflict_files == ["src/app.py"]
 
-    def test_merge_ff_fails(self, tmp_path: Path):
+    def test_merge_ff_fails(self, mock_run_git: MagicMock):
         """Phase1 rebase OK → Phase2 ff-merge 失败 → ERROR."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         responses = [
-            _cp(stdout=""),                     # Phase1: status (clean)
+            _OK,                                # Phase1: status (clean)
             _cp(stdout="abc1234 change"),       # Phase1: log (has commits)
-            _cp(),                              # Phase1: rebase main
-            _cp(),                              # Phase2: rebase main (re-rebase)
+            _OK,                                # Phase1: rebase main
+            _OK,                                # Phase2: rebase main (re-rebase)
             _cp(stdout="vibe/w0-123"),          # Phase2: branch name
             _cp(returncode=1, stderr="Not possible to fast-forward"),  # ff fails
         ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
+        mock_run_git.side_effect = responses
+        result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.ERROR
         assert "ff-merge" in result.message
 
-    def test_commit_fails(self, tmp_path: Path):
+    def test_commit_fails(self, mock_run_git: MagicMock):
         """commit 失败（非 nothing-to-commit）→ ERROR（Phase 1 终止）."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         responses = [
             _cp(stdout="M file.py"),            # status
-            _cp(stdout=""),                     # log
-            _cp(),                              # add -A
+            _OK,                                # log
+            _OK,                                # add -A
             _cp(returncode=1, stderr="author identity unknown"),  # commit fails
         ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
+        mock_run_git.side_effect = responses
+        result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.ERROR
         assert "commit 失败" in result.message
 
-    def test_nothing_to_commit_but_has_prior(self, tmp_path: Path):
+    def test_nothing_to_commit_but_has_prior(self, mock_run_git: MagicMock):
         """commit 报 nothing 但有先前 commits → Phase1 rebase → Phase2 ff-merge."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         responses = [
             _cp(stdout="M file.py"),            # Phase1: status (shows dirty)
             _cp(stdout="abc1234 prior change"), # Phase1: log (has prior)
-            _cp(),                              # Phase1: add -A
+            _OK,                                # Phase1: add -A
             _cp(returncode=1, stdout="nothing to commit"),  # Phase1: commit "fails"
-            _cp(),                              # Phase1: rebase main
-            _cp(),                              # Phase2: rebase main (re-rebase)
+            _OK,                                # Phase1: rebase main
+            _OK,                                # Phase2: rebase main (re-rebase)
             _cp(stdout="vibe/w0-123"),          # Phase2: branch name
-            _cp(),                              # Phase2: merge --ff-only
+            _OK,                                # Phase2: merge --ff-only
         ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
+        mock_run_git.side_effect = responses
+        result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.SUCCESS
 
-    def test_nothing_to_commit_no_prior(self, tmp_path: Path):
+    def test_nothing_to_commit_no_prior(self, mock_run_git: MagicMock):
         """commit 报 nothing 且无先前 commits → NO_CHANGES（Phase 1 终止）."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         responses = [
             _cp(stdout="M file.py"),            # status (shows dirty but git add resolves)
-            _cp(stdout=""),                     # log (no prior)
-            _cp(),                              # add -A
+            _OK,                                # log (no prior)
+            _OK,                                # add -A
             _cp(returncode=1, stdout="nothing to commit"),  # commit "fails"
         ]
-        with patch("vibe.worktree._run_git", side_effect=responses):
-            result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
+        mock_run_git.side_effect = responses
+        result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.NO_CHANGES
 
-    def test_refresh_worktree_success(self, tmp_path: Path):
+    def test_refresh_worktree_success(self, mock_run_git: MagicMock):
         """reset --hard main 成功."""
-        coordinator = MergeCoordinator(tmp_path)
-        with patch("vibe.worktree._run_git", return_value=_cp()):
-            assert coordinator.refresh_worktree(Path("/tmp/wt")) is True
+        coordinator = MergeCoordinator(_REPO)
+        mock_run_git.return_value = _OK
+        assert coordinator.refresh_worktree(Path("/tmp/wt")) is True
 
-    def test_refresh_worktree_failure(self, tmp_path: Path):
+    def test_refresh_worktree_failure(self, mock_run_git: MagicMock):
         """reset --hard main 失败."""
-        coordinator = MergeCoordinator(tmp_path)
-        with patch("vibe.worktree._run_git", return_value=_cp(returncode=1, stderr="error")):
-            assert coordinator.refresh_worktree(Path("/tmp/wt")) is False
+        coordinator = MergeCoordinator(_REPO)
+        mock_run_git.return_value = _FAIL
+        assert coordinator.refresh_worktree(Path("/tmp/wt")) is False
 
-    def test_thread_safety(self, tmp_path: Path):
+    def test_thread_safety(self, mock_run_git: MagicMock):
         """2 线程并发 → 都能完成."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         call_order: list[str] = []
         order_lock = threading.Lock()
 
-        def mock_run_git(args, cwd):
+        def fake_run_git(args, cwd):
             cmd = args[0] if args else ""
             if cmd == "status":
                 with order_lock:
                     call_order.append(f"status-{cwd}")
-                return _cp(stdout="")
+                return _OK
             if cmd == "log":
-                return _cp(stdout="")
-            return _cp()
+                return _OK
+            return _OK
+
+        mock_run_git.side_effect = fake_run_git
 
         def merge_worker(name):
-            with patch("vibe.worktree._run_git", side_effect=mock_run_git):
-                coordinator.merge_task(Path(f"/tmp/{name}"), name)
+            coordinator.merge_task(Path(f"/tmp/{name}"), name)
 
         t1 = threading.Thread(target=merge_worker, args=("wt1",))
         t2 = threading.Thread(target=merge_worker, args=("wt2",))
@@ -288,91 +303,83 @@ class TestMergeCoordinator:
         # Both threads completed
         assert len(call_order) == 2
 
-    def test_conflict_resolved_by_claude(self, tmp_path: Path):
+    def test_conflict_resolved_by_claude(self, mock_run_git: MagicMock):
         """Phase 1 冲突 → Claude 解决成功 → Phase 2 ff-merge."""
         from vibe.manager import TaskResult
 
         coordinator = MergeCoordinator(
-            tmp_path, resolve_conflicts=True, conflict_timeout=60,
+            _REPO, resolve_conflicts=True, conflict_timeout=60,
         )
         conflict_stderr = "CONFLICT (content): Merge conflict in src/app.py"
         responses = [
-            _cp(stdout=""),                     # Phase1: status (clean)
+            _OK,                                # Phase1: status (clean)
             _cp(stdout="abc1234 change"),       # Phase1: log (has commits)
             _cp(returncode=1, stderr=conflict_stderr),  # Phase1: rebase fails
             # After Claude resolves: _is_rebase_in_progress checks
             _cp(stdout="/tmp/wt/.git"),         # rev-parse --git-dir
             # Phase2: re-rebase + ff-merge
-            _cp(),                              # Phase2: rebase main
+            _OK,                                # Phase2: rebase main
             _cp(stdout="vibe/w0-123"),          # Phase2: rev-parse branch
-            _cp(),                              # Phase2: merge --ff-only
+            _OK,                                # Phase2: merge --ff-only
         ]
         mock_resolve = TaskResult(success=True, output="resolved")
-        with (
-            patch("vibe.worktree._run_git", side_effect=responses),
-            patch("vibe.manager.resolve_conflicts", return_value=mock_resolve),
-        ):
+        mock_run_git.side_effect = responses
+        with patch("vibe.manager.resolve_conflicts", return_value=mock_resolve):
             result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.SUCCESS
 
-    def test_conflict_resolution_fails(self, tmp_path: Path):
+    def test_conflict_resolution_fails(self, mock_run_git: MagicMock):
         """Claude 解决失败 → abort → CONFLICT."""
         from vibe.manager import TaskResult
 
         coordinator = MergeCoordinator(
-            tmp_path, resolve_conflicts=True, conflict_timeout=60,
+            _REPO, resolve_conflicts=True, conflict_timeout=60,
         )
         conflict_stderr = "CONFLICT (content): Merge conflict in src/app.py"
         responses = [
-            _cp(stdout=""),                     # Phase1: status
+            _OK,                                # Phase1: status
             _cp(stdout="abc1234 change"),       # Phase1: log
             _cp(returncode=1, stderr=conflict_stderr),  # Phase1: rebase fails
-            _cp(),                              # rebase --abort (after Claude fails)
+            _OK,                                # rebase --abort (after Claude fails)
         ]
         mock_resolve = TaskResult(success=False, error="could not resolve")
-        with (
-            patch("vibe.worktree._run_git", side_effect=responses),
-            patch("vibe.manager.resolve_conflicts", return_value=mock_resolve),
-        ):
+        mock_run_git.side_effect = responses
+        with patch("vibe.manager.resolve_conflicts", return_value=mock_resolve):
             result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.CONFLICT
         assert "Claude 解决失败" in result.message
 
-    def test_conflict_resolution_disabled(self, tmp_path: Path):
+    def test_conflict_resolution_disabled(self, mock_run_git: MagicMock):
         """resolve_conflicts=False → 直接 abort（不调 Claude）."""
-        coordinator = MergeCoordinator(tmp_path, resolve_conflicts=False)
+        coordinator = MergeCoordinator(_REPO, resolve_conflicts=False)
         conflict_stderr = "CONFLICT (content): Merge conflict in src/app.py"
         responses = [
-            _cp(stdout=""),                     # status
+            _OK,                                # status
             _cp(stdout="abc1234 change"),       # log
             _cp(returncode=1, stderr=conflict_stderr),  # rebase fails
-            _cp(),                              # rebase --abort
+            _OK,                                # rebase --abort
         ]
-        with (
-            patch("vibe.worktree._run_git", side_effect=responses),
-            patch("vibe.manager.resolve_conflicts") as mock_resolve,
-        ):
+        mock_run_git.side_effect = responses
+        with patch("vibe.manager.resolve_conflicts") as mock_resolve:
             result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.CONFLICT
         mock_resolve.assert_not_called()
 
-    def test_phase2_rerebase_conflict(self, tmp_path: Path):
+    def test_phase2_rerebase_conflict(self, mock_run_git: MagicMock):
         """Phase 1 成功但 Phase 2 re-rebase 冲突 → CONFLICT（不调 Claude）."""
         coordinator = MergeCoordinator(
-            tmp_path, resolve_conflicts=True, conflict_timeout=60,
+            _REPO, resolve_conflicts=True, conflict_timeout=60,
         )
         conflict_stderr = "CONFLICT (content): Merge conflict in src/new.py"
         responses = [
-            _cp(stdout=""),                     # Phase1: status
+            _OK,                                # Phase1: status
             _cp(stdout="abc1234 change"),       # Phase1: log
-            _cp(),                              # Phase1: rebase main (OK)
+            _OK,                                # Phase1: rebase main (OK)
             _cp(returncode=1, stderr=conflict_stderr),  # Phase2: re-rebase fails
-            _cp(),                              # Phase2: rebase --abort
+            _OK,                                # Phase2: rebase --abort
         ]
-        with (
-            patch("vibe.worktree._run_git", side_effect=responses),
-            patch("vibe.manager.resolve_conflicts") as mock_resolve,
-        ):
+        mock_run_git.side_effect = responses
+        with patch("vibe.manager.resolve_conflicts") as mock_resolve:
             result = coordinator.merge_task(Path("/tmp/wt"), "task-1")
         assert result.status == MergeStatus.CONFLICT
         assert "Phase 2" in result.message
@@ -381,25 +388,25 @@ class TestMergeCoordinator:
 
 
 class TestSyncWorktree:
-    def test_sync_worktree_clean(self, tmp_path: Path):
+    def test_sync_worktree_clean(self, mock_run_git: MagicMock):
         """rebase 成功 → 返回 True."""
-        coordinator = MergeCoordinator(tmp_path)
-        with patch("vibe.worktree._run_git", return_value=_cp()):
-            assert coordinator.sync_worktree(Path("/tmp/wt")) is True
+        coordinator = MergeCoordinator(_REPO)
+        mock_run_git.return_value = _OK
+        assert coordinator.sync_worktree(Path("/tmp/wt")) is True
 
-    def test_sync_worktree_conflict_resets(self, tmp_path: Path):
+    def test_sync_worktree_conflict_resets(self, mock_run_git: MagicMock):
         """rebase 冲突 → abort + reset --hard main → 返回 True."""
-        coordinator = MergeCoordinator(tmp_path)
+        coordinator = MergeCoordinator(_REPO)
         responses = [
             _cp(returncode=1, stderr="CONFLICT"),  # rebase main (fails)
-            _cp(),                                  # rebase --abort
-            _cp(),                                  # reset --hard main
+            _OK,                                    # rebase --abort
+            _OK,                                    # reset --hard main
         ]
-        with patch("vibe.worktree._run_git", side_effect=responses) as mock_git:
-            assert coordinator.sync_worktree(Path("/tmp/wt")) is True
+        mock_run_git.side_effect = responses
+        assert coordinator.sync_worktree(Path("/tmp/wt")) is True
 
         # 验证调用了 abort 和 reset
-        calls = [c[0][0] for c in mock_git.call_args_list]
+        calls = [c[0][0] for c in mock_run_git.call_args_list]
         assert calls[0] == ["rebase", "main"]
         assert calls[1] == ["rebase", "--abort"]
         assert calls[2] == ["reset", "--hard", "main"]